@@ -0,0 +1,6 @@
+#
+# animFilters core - host independent curve storage and filter engines.
+#
+# The modules in this package only depend on NumPy/SciPy so they can be
+# used by the 3ds Max tool, the command line and the benchmarks alike.
+#
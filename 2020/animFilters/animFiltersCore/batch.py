@@ -0,0 +1,184 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .butterworth import STREAM_BLOCK, butter_lowpass, butter_lowpass_filter, butter_lowpass_stream, butterworth_curve, resample_times, sos_padlen
+from .curves import CurveBuffer
+from .median import median_filter_1d
+
+# curves from this many frames are filtered in blocks instead of stacked
+STREAM_MIN_FRAMES = 1 << 20
+
+
+class CurveBatch(object):
+	"""
+	Several per frame sampled curves of one length stacked into a
+	(curves x frames) matrix, filters run once along the time axis for the
+	whole batch.
+	"""
+	__slots__ = ("keys", "curves", "matrix")
+
+	def __init__(self, keys, curves):
+		# type: (list, list) -> None
+		self.keys = keys
+		self.curves = curves
+		self.matrix = np.vstack([c.values for c in curves])
+
+	def __len__(self):
+		return len(self.keys)
+
+	def split(self, matrix):
+		# type: (np.ndarray) -> dict
+		"""
+		Turn a filtered matrix back into per curve buffers on the original frames
+
+		:param matrix: filtered (curves x frames) matrix
+		:return: {key: CurveBuffer}
+		"""
+		result = {}
+		for row, key in enumerate(self.keys):
+			result[key] = CurveBuffer(self.curves[row].times, matrix[row])
+		return result
+
+
+def group_curves(curves):
+	# type: (dict) -> list
+	"""
+	Group curves for batched filtering
+
+	:param curves: {key: CurveBuffer} sampled on every frame
+	:return: list of CurveBatch, one per frame count
+	"""
+	groups = {}
+	for key, curve in curves.items():
+		groups.setdefault(len(curve), []).append(key)
+	return [CurveBatch(keys, [curves[k] for k in keys]) for keys in groups.values()]
+
+
+def _resample_rows(matrix, positions):
+	# type: (np.ndarray, np.ndarray) -> np.ndarray
+	"""
+	Linear interpolation of every row at fractional sample positions
+	"""
+	base = np.minimum(positions.astype(np.intp), matrix.shape[1] - 2)
+	frac = positions - base
+	return matrix[:, base] * (1 - frac) + matrix[:, base + 1] * frac
+
+
+def _stream_curve(curve, cutoff, fs, order, scene_fps):
+	# type: (CurveBuffer, float, float, int, float) -> CurveBuffer
+	"""
+	Butterworth low pass of one long curve through butter_lowpass_stream
+
+	Off the scene rate the samples are interpolated block by block into a
+	single filter rate buffer, filtered in place and interpolated back block
+	by block, so only that buffer and the result are ever held in full.
+	"""
+	values = curve.values
+	if fs == scene_fps:
+		return CurveBuffer(curve.times, butter_lowpass_stream(values, cutoff, fs, order))
+	count = values.shape[0]
+	# sample count of resample_times(0, count - 1, fs, scene_fps)
+	nsamples = int(((fs * (count - 1)) / scene_fps) + 1)
+	if nsamples < 2:
+		return butterworth_curve(curve, cutoff, fs, order, scene_fps)
+	rows = values[np.newaxis]
+	# same positions as the batched path below
+	step = (count - 1) / float(nsamples - 1)
+	x = np.empty(nsamples)
+	for start in range(0, nsamples, STREAM_BLOCK):
+		stop = min(start + STREAM_BLOCK, nsamples)
+		x[start:stop] = _resample_rows(rows, np.arange(start, stop) * step)[0]
+	butter_lowpass_stream(x, cutoff, fs, order, out=x)
+	filtered = np.empty(count)
+	rows = x[np.newaxis]
+	for start in range(0, count, STREAM_BLOCK):
+		stop = min(start + STREAM_BLOCK, count)
+		filtered[start:stop] = _resample_rows(rows, np.arange(start, stop) / step)[0]
+	return CurveBuffer(curve.times, filtered)
+
+
+def median_batch(curves, window_size):
+	# type: (dict, int) -> dict
+	"""
+	Median filter of many curves
+
+	Every curve goes through the one dimensional median engine on its own
+	samples, the generic N-D kernel of scipy.ndimage is several times slower
+	than filtering curve by curve, so stacking them would not pay off.
+
+	:param curves: {key: CurveBuffer} sampled on every frame
+	:param window_size: odd median window
+	:return: {key: CurveBuffer}
+	"""
+	result = {}
+	for key in curves.keys():
+		curve = curves[key]
+		result[key] = CurveBuffer(curve.times, median_filter_1d(curve.values, window_size))
+	return result
+
+
+def butterworth_batch(curves, cutoff, fs, order=5, scene_fps=30.0):
+	# type: (dict, float, float, int, float) -> dict
+	"""
+	Butterworth low pass of many curves, one filter call per frame count
+
+	Edge padding depends on where each curve ends, so only curves of the
+	same length are stacked together. Very long takes at the scene rate go
+	through butter_lowpass_stream one by one, resampled block by block when
+	the filter rate differs from the scene rate.
+
+	:param curves: {key: CurveBuffer} sampled on every frame
+	:param cutoff: cutoff frequency
+	:param fs: filter sample frequency
+	:param order: filter order
+	:param scene_fps: scene frame rate
+	:return: {key: CurveBuffer}
+	"""
+	from scipy.signal import sosfiltfilt
+	sos = butter_lowpass(cutoff, fs, order)
+	result = {}
+	for key in curves.keys():
+		curve = curves[key]
+		if len(curve) >= STREAM_MIN_FRAMES:
+			result[key] = _stream_curve(curve, cutoff, fs, order, scene_fps)
+	if result:
+		curves = dict((key, curves[key]) for key in curves.keys() if key not in result)
+	for batch in group_curves(curves):
+		count = batch.matrix.shape[1]
+		if count < 2:
+			result.update(batch.split(batch.matrix))
+			continue
+		if fs == scene_fps:
+			x = batch.matrix
+		else:
+			t_space = resample_times(0, count - 1, fs, scene_fps)
+			if t_space.shape[0] < 2:
+				# a single filter sample, there is nothing to resample between
+				for key, curve in zip(batch.keys, batch.curves):
+					result[key] = butterworth_curve(curve, cutoff, fs, order, scene_fps)
+				continue
+			x = _resample_rows(batch.matrix, t_space)
+		if x.shape[1] > sos_padlen(sos):
+			y = sosfiltfilt(sos, x, axis=-1)
+		else:
+			y = butter_lowpass_filter(x, cutoff, fs, order)
+		if fs != scene_fps:
+			step = (count - 1) / float(x.shape[1] - 1)
+			y = _resample_rows(y, np.arange(count) / step)
+		result.update(batch.split(y))
+	return result
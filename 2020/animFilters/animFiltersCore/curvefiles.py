@@ -0,0 +1,108 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from .archive import TakeArchive, write_archive
+from .curves import CurveBuffer
+
+# exported curve files:
+#   csv   first column frame, one column per track, empty cells mean no key
+#   json  {track: {frame: value}}, the legacy key dictionary per track
+#   npz   "times/<track>" and "values/<track>" arrays
+#   take  memory mapped take archive, see archive.py
+FORMATS = ("csv", "json", "npz", "take")
+
+
+def file_format(path):
+	# type: (str) -> str
+	fmt = os.path.splitext(path)[1].lower().lstrip(".")
+	if fmt not in FORMATS:
+		raise ValueError("Unsupported curve file %s, expected one of %s" % (path, ", ".join(FORMATS)))
+	return fmt
+
+
+def read_curves(path):
+	# type: (str) -> dict
+	"""
+	:param path: .csv, .json, .npz or .take file
+	:return: {track: CurveBuffer}, read-only views into the file for take archives
+	"""
+	fmt = file_format(path)
+	if fmt == "take":
+		return TakeArchive(path).curves()
+	if fmt == "json":
+		with open(path) as f:
+			data = json.load(f)
+		return dict((track, CurveBuffer.from_dict(keys)) for track, keys in data.items())
+	if fmt == "npz":
+		archive = np.load(path)
+		try:
+			return dict((name[len("times/"):], CurveBuffer(archive[name], archive["values/" + name[len("times/"):]]))
+						for name in archive.files if name.startswith("times/"))
+		finally:
+			archive.close()
+	with open(path) as f:
+		rows = list(csv.reader(f))
+	if not rows:
+		return {}
+	header = rows[0]
+	table = np.array([[float(cell) if cell.strip() else np.nan for cell in row] for row in rows[1:] if row],
+					 dtype=np.float64).reshape(-1, len(header))
+	curves = {}
+	for column, track in enumerate(header[1:], 1):
+		keyed = ~np.isnan(table[:, column])
+		curves[track] = CurveBuffer(table[keyed, 0], table[keyed, column])
+	return curves
+
+
+def write_curves(path, curves):
+	# type: (str, dict) -> None
+	"""
+	:param path: .csv, .json, .npz or .take file
+	:param curves: {track: CurveBuffer}
+	"""
+	fmt = file_format(path)
+	if fmt == "take":
+		write_archive(path, curves)
+		return
+	tracks = sorted(curves.keys())
+	if fmt == "json":
+		with open(path, "w") as f:
+			json.dump(dict((track, curves[track].to_dict()) for track in tracks), f)
+		return
+	if fmt == "npz":
+		arrays = {}
+		for track in tracks:
+			arrays["times/" + track] = curves[track].times
+			arrays["values/" + track] = curves[track].values
+		with open(path, "wb") as f:
+			np.savez(f, **arrays)
+		return
+	# curves with different keys share the frame column, missing keys stay empty
+	frames = np.unique(np.concatenate([curves[track].times for track in tracks])) if tracks else np.empty(0)
+	table = np.full((frames.shape[0], len(tracks)), np.nan)
+	for column, track in enumerate(tracks):
+		table[np.searchsorted(frames, curves[track].times), column] = curves[track].values
+	with open(path, "w") as f:
+		writer = csv.writer(f, lineterminator="\n")
+		writer.writerow(["frame"] + tracks)
+		for frame, row in zip(frames.tolist(), table.tolist()):
+			writer.writerow(["%g" % frame] + ["" if v != v else repr(v) for v in row])
@@ -0,0 +1,243 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .curves import CurveBuffer
+
+
+# segments longer than this are measured one by one on contiguous slices,
+# shorter ones are gathered together into a single batched pass
+_BATCH_LIMIT = 4096
+# batched segments up to this many interior samples are laid out as columns
+_COLUMN_LIMIT = 32
+
+
+def _batched_errors(times, values, seg_start, seg_end):
+	# type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> tuple
+	interior = seg_end - seg_start - 1
+	total = np.zeros(interior.shape[0])
+	offender = seg_start.copy()
+	outlier = np.zeros(interior.shape[0])
+	# segments are grouped by interior sample count, longer ones padded to a
+	# power of two, and measured as one matrix per group, so the end points
+	# broadcast instead of being repeated for every sample. Padding reads the
+	# end point again, its error is exactly 0.
+	height = np.where(interior <= _COLUMN_LIMIT, interior,
+					  np.left_shift(1, np.frexp(np.maximum(interior, 1) - 1)[1]))
+	order = np.argsort(height, kind="mergesort")
+	sizes, firsts = np.unique(height[order], return_index=True)
+	for size, group in zip(sizes, np.split(order, firsts[1:])):
+		group = group[interior[group] > 0]
+		if not group.shape[0]:
+			continue
+		if size <= _COLUMN_LIMIT:
+			# short segments are columns, every step runs along long rows
+			start, end = seg_start[group], seg_end[group]
+			idx = np.minimum(start + np.arange(1, size + 1)[:, None], end)
+			axis = 0
+		else:
+			start, end = seg_start[group][:, None], seg_end[group][:, None]
+			idx = np.minimum(start + np.arange(1, size + 1), end)
+			axis = 1
+		ts = times[start]
+		offset = (times[idx] - ts) / (times[end] - ts)
+		delta = np.abs(values[idx] - ((offset * values[end]) + ((1 - offset) * values[start])))
+		total[group] = delta.sum(axis=axis)
+		# first sample reaching the segment maximum, same tie-break as the old loop
+		worst = delta.argmax(axis=axis)
+		columns = np.arange(group.shape[0])
+		if axis:
+			offender[group] = idx[columns, worst]
+			outlier[group] = delta[columns, worst]
+		else:
+			offender[group] = idx[worst, columns]
+			outlier[group] = delta[worst, columns]
+	return total, offender, outlier
+
+
+def _slice_errors(times, values, start, end):
+	# type: (np.ndarray, np.ndarray, int, int) -> tuple
+	t = times[start:end + 1]
+	v = values[start:end + 1]
+	offset = (t - t[0]) / (t[-1] - t[0])
+	delta = np.abs(v - ((offset * v[-1]) + ((1 - offset) * v[0])))
+	worst = int(delta.argmax())
+	return delta.sum(), start + worst, delta[worst]
+
+
+def _segment_errors(times, values, seg_start, seg_end):
+	# type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> tuple
+	"""
+	Measure the chord error of many segments at once
+
+	Every segment [seg_start, seg_end] (inclusive sample indices) is compared
+	against the straight line between its end points, exactly like the old
+	recursive resample_keys did for a single segment.
+
+	:return: total error, split index (first worst sample), worst error and sample count per segment
+	"""
+	counts = seg_end - seg_start + 1
+	total = np.empty(counts.shape[0])
+	offender = np.empty(counts.shape[0], dtype=np.intp)
+	outlier = np.empty(counts.shape[0])
+
+	large = counts > _BATCH_LIMIT
+	for i in np.flatnonzero(large):
+		total[i], offender[i], outlier[i] = _slice_errors(times, values, seg_start[i], seg_end[i])
+	small = ~large
+	if small.any():
+		total[small], offender[small], outlier[small] = _batched_errors(
+			times, values, seg_start[small], seg_end[small])
+	return total, offender, outlier, counts
+
+
+def _split_frontier(times, values, seg_start, seg_end):
+	# type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> tuple
+	"""
+	Evaluate one frontier of segments
+
+	A segment can only be split when it holds more than its two end points and
+	is not already a perfect line.
+
+	:return: total error, split index and splittable mask per segment
+	"""
+	total, offender, outlier, counts = _segment_errors(times, values, seg_start, seg_end)
+	return total, offender, (counts > 2) & (outlier > 0)
+
+
+def _next_frontier(seg_start, seg_end, offender):
+	# type: (np.ndarray, np.ndarray, np.ndarray) -> tuple
+	seg_start = np.concatenate((seg_start, offender))
+	seg_end = np.concatenate((offender, seg_end))
+	# two sample segments are final, no need to measure them
+	pending = (seg_end - seg_start) > 1
+	return seg_start[pending], seg_end[pending], pending
+
+
+def decimate_indices(times, values, tolerance):
+	# type: (np.ndarray, np.ndarray, float) -> np.ndarray
+	"""
+	Adaptive key reduction of a sampled curve
+
+	Iterative replacement of the recursive resample_keys: segments waiting to
+	be processed live on an explicit frontier and all of them are measured in a
+	single vectorized pass, so there is no recursion limit and no per-segment
+	dictionary rebuilding.
+
+	:param times: sample times, strictly increasing
+	:param values: sample values
+	:param tolerance: summed absolute error allowed per segment
+	:return: sorted indices of the samples to keep
+	"""
+	times = np.asarray(times, dtype=np.float64)
+	values = np.asarray(values, dtype=np.float64)
+	count = times.shape[0]
+	if count <= 2:
+		return np.arange(count)
+
+	keep = np.zeros(count, dtype=bool)
+	keep[0] = keep[-1] = True
+	seg_start = np.array([0])
+	seg_end = np.array([count - 1])
+	while seg_start.shape[0]:
+		total, offender, split = _split_frontier(times, values, seg_start, seg_end)
+		split &= total >= tolerance
+		offender = offender[split]
+		keep[offender] = True
+		seg_start, seg_end, _ = _next_frontier(seg_start[split], seg_end[split], offender)
+	return np.flatnonzero(keep)
+
+
+def decimate_curve(curve, tolerance):
+	# type: (CurveBuffer, float) -> CurveBuffer
+	"""
+	Adaptive key reduction of a curve buffer
+
+	:param curve: sampled curve
+	:param tolerance: summed absolute error allowed per segment
+	:return: new curve buffer holding only the kept keys
+	"""
+	kept = decimate_indices(curve.times, curve.values, tolerance)
+	return CurveBuffer(curve.times[kept], curve.values[kept])
+
+
+class DecimationTree(object):
+	"""
+	Complete split hierarchy of the adaptive filter for one curve
+
+	The split point of a segment does not depend on the tolerance, only the
+	decision to split does (summed error >= tolerance). A split therefore
+	survives a tolerance when the summed error of its segment and of all of its
+	parent segments reaches it, so every split is stored with the smallest of
+	those errors. Sorting by that level turns any tolerance into a prefix of
+	the split list and moving the slider costs O(kept keys).
+	"""
+	__slots__ = ("curve", "_splits", "_levels")
+
+	def __init__(self, curve):
+		# type: (CurveBuffer) -> None
+		self.curve = curve
+		times, values = curve.times, curve.values
+		count = times.shape[0]
+		splits = []
+		levels = []
+		seg_start = np.array([0]) if count > 2 else np.array([], dtype=np.intp)
+		seg_end = np.array([count - 1]) if count > 2 else np.array([], dtype=np.intp)
+		seg_level = np.array([np.inf]) if count > 2 else np.array([])
+		while seg_start.shape[0]:
+			total, offender, split = _split_frontier(times, values, seg_start, seg_end)
+			level = np.minimum(seg_level, total)[split]
+			offender = offender[split]
+			splits.append(offender)
+			levels.append(level)
+			seg_start, seg_end, pending = _next_frontier(seg_start[split], seg_end[split], offender)
+			seg_level = np.concatenate((level, level))[pending]
+
+		splits = np.concatenate(splits) if splits else np.array([], dtype=np.intp)
+		levels = np.concatenate(levels) if levels else np.array([])
+		order = np.argsort(-levels, kind="mergesort")
+		self._splits = splits[order]
+		# ascending negated levels so searchsorted finds the surviving prefix
+		self._levels = -levels[order]
+
+	def __len__(self):
+		return self._splits.shape[0]
+
+	def cut_indices(self, tolerance):
+		# type: (float) -> np.ndarray
+		"""
+		Sample indices kept by the adaptive filter for a tolerance
+
+		:param tolerance: summed absolute error allowed per segment
+		:return: sorted indices of the samples to keep
+		"""
+		count = len(self.curve)
+		if count <= 2:
+			return np.arange(count)
+		kept = self._splits[:np.searchsorted(self._levels, -tolerance, side="right")]
+		return np.concatenate(([0], np.sort(kept), [count - 1]))
+
+	def cut(self, tolerance):
+		# type: (float) -> CurveBuffer
+		"""
+		Decimated curve for a tolerance, same result as decimate_curve
+
+		:param tolerance: summed absolute error allowed per segment
+		:return: new curve buffer holding only the kept keys
+		"""
+		kept = self.cut_indices(tolerance)
+		return CurveBuffer(self.curve.times[kept], self.curve.values[kept])
@@ -0,0 +1,80 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .batch import butterworth_batch, median_batch
+from .curves import CurveBuffer
+from .decimation import DecimationTree, decimate_curve
+
+
+def median_filter(raw_anim_curves, window_size=15):
+	if raw_anim_curves is None:
+		return
+	if window_size % 2 == 0:
+		window_size += 1
+	# the last frame is left untouched, apply_curves keeps the end key
+	trimmed = {}
+	for key in raw_anim_curves.keys():
+		curve = raw_anim_curves[key]
+		trimmed[key] = CurveBuffer(curve.times[:-1], curve.values[:-1])
+	return median_batch(trimmed, window_size)
+
+
+def butterworth_filter(raw_anim_curves, fs=30.0, cutoff=5.0, order=5):
+	if raw_anim_curves is None:
+		return
+	return butterworth_batch(raw_anim_curves, cutoff, fs, order)
+
+
+def build_decimation_trees(raw_anim_curves):
+	trees = {}
+	for key in raw_anim_curves.keys():
+		trees[key] = DecimationTree(raw_anim_curves[key])
+	return trees
+
+
+def adaptive_filter(raw_anim_curves, tolerance_value, trees=None):
+	processed_curves = {}
+	for key in raw_anim_curves.keys():
+		if trees is not None:
+			processed_curves[key] = trees[key].cut(tolerance_value)
+		else:
+			processed_curves[key] = decimate_curve(raw_anim_curves[key], tolerance_value)
+	return processed_curves
+
+
+def display_curves(processed_curves, max_samples):
+	# type: (dict, int) -> dict
+	"""
+	Thin curves out to display resolution for a quick preview write
+
+	Curves longer than max_samples keep every n-th key plus their last one,
+	shorter curves are passed through.
+	"""
+	result = {}
+	for key in processed_curves.keys():
+		curve = processed_curves[key]
+		count = len(curve)
+		if count <= max_samples:
+			result[key] = curve
+			continue
+		stride = -(-count // max_samples)
+		index = np.arange(0, count, stride)
+		if index[-1] != count - 1:
+			index = np.append(index, count - 1)
+		result[key] = CurveBuffer(curve.times[index], curve.values[index])
+	return result
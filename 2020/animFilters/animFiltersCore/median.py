@@ -0,0 +1,132 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+import scipy
+
+# recent SciPy releases ship an O(n log w) one dimensional rank filter in
+# ndimage, older ones (like the builds used inside 3ds Max) sort every window
+_FAST_RANK_FILTER = tuple(int(p) for p in scipy.__version__.split(".")[:2] if p.isdigit()) >= (1, 12)
+
+# window size from which the running median beats scipy.signal.medfilt of
+# SciPy < 1.12, they break even between 101 and 151 with SciPy 1.11, see
+# benchmarks/bench_median.py
+RUNNING_MEDIAN_MIN_WINDOW = 151
+
+
+def running_median(x, window_size):
+	# type: (np.ndarray, int) -> np.ndarray
+	"""
+	Sliding window median in O(n log w)
+
+	Two heaps split the window into its lower and upper half, samples leaving
+	the window are only marked and dropped once they surface at a heap top.
+	Both ends are zero padded exactly like scipy.signal.medfilt.
+
+	:param x: 1D samples
+	:param window_size: odd window size
+	:return: filtered samples
+	"""
+	if window_size % 2 != 1:
+		raise ValueError("window_size should be odd.")
+	data = np.asarray(x, dtype=np.float64)
+	count = data.shape[0]
+	half = window_size // 2
+	padded = [0.0] * half + data.tolist() + [0.0] * half
+	result = np.empty(count)
+	if not count:
+		return result
+
+	# lo is a max heap holding half + 1 valid samples, hi a min heap with the rest
+	window = sorted((padded[i], i) for i in range(window_size))
+	lo = [(-v, i) for v, i in window[:half + 1]]
+	hi = window[half + 1:]
+	heapify(lo)
+	heapify(hi)
+	in_lo = bytearray(len(padded))
+	for _, i in lo:
+		in_lo[i] = 1
+	dead = bytearray(len(padded))
+	lo_count, hi_count = half + 1, half
+	result[0] = -lo[0][0]
+
+	for i in range(window_size, len(padded)):
+		gone = i - window_size
+		dead[gone] = 1
+		if in_lo[gone]:
+			lo_count -= 1
+		else:
+			hi_count -= 1
+		while lo and dead[lo[0][1]]:
+			heappop(lo)
+		while hi and dead[hi[0][1]]:
+			heappop(hi)
+
+		v = padded[i]
+		if lo_count and v <= -lo[0][0]:
+			heappush(lo, (-v, i))
+			in_lo[i] = 1
+			lo_count += 1
+		else:
+			heappush(hi, (v, i))
+			hi_count += 1
+
+		if lo_count > half + 1:
+			nv, j = heappop(lo)
+			heappush(hi, (-nv, j))
+			in_lo[j] = 0
+			lo_count -= 1
+			hi_count += 1
+			while lo and dead[lo[0][1]]:
+				heappop(lo)
+		elif lo_count < half + 1:
+			nv, j = heappop(hi)
+			heappush(lo, (-nv, j))
+			in_lo[j] = 1
+			lo_count += 1
+			hi_count -= 1
+			while hi and dead[hi[0][1]]:
+				heappop(hi)
+
+		# marked samples can pile up below the tops, rebuild to keep log(w)
+		if len(lo) + len(hi) > 4 * window_size:
+			lo = [e for e in lo if not dead[e[1]]]
+			hi = [e for e in hi if not dead[e[1]]]
+			heapify(lo)
+			heapify(hi)
+		result[gone + 1] = -lo[0][0]
+	return result
+
+
+def median_filter_1d(x, window_size):
+	# type: (np.ndarray, int) -> np.ndarray
+	"""
+	Zero padded median filter using the fastest engine available
+
+	:param x: 1D samples
+	:param window_size: odd window size
+	:return: filtered samples
+	"""
+	# imported on first use like scipy.signal in butterworth.py
+	if _FAST_RANK_FILTER:
+		from scipy.ndimage import median_filter
+		return median_filter(x, size=window_size, mode="constant", cval=0.0)
+	if window_size >= RUNNING_MEDIAN_MIN_WINDOW:
+		return running_median(x, window_size)
+	from scipy.signal import medfilt
+	return medfilt(x, window_size)
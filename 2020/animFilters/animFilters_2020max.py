@@ -22,6 +22,8 @@
 import sys
 import os
 import math
+import platform
+import time
 
 from functools import partial
 from distutils.util import strtobool
@@ -32,235 +34,37 @@ from PySide2 import QtUiTools
 from PySide2 import shiboken2
 
 from pymxs import runtime 
-import numpy as np
-from scipy.signal import butter, filtfilt, medfilt
 
 # Where is this script?
 SCRIPT_LOC = os.path.split(__file__)[0]
+if SCRIPT_LOC not in sys.path:
+	sys.path.append(SCRIPT_LOC)
+
+from animFiltersCore.cache import ResultCache
+from animFiltersCore.filters import adaptive_filter, build_decimation_trees, butterworth_filter, display_curves, median_filter
+from animFiltersCore.hosts import MaxHost
+from animFiltersCore.pipeline import PreviewWriter, apply_curves, copy_original_curves, get_raw_curves, paste_clipboard_curves
+from animFiltersCore.profiler import HostProfiler
+from animFiltersCore.timing import StageTimer, TimingLog, timed
+from animFiltersCore.worker import FilterWorker
+
+# compiled by build_ui.py, the .ui file is parsed at runtime without it
+try:
+	from animFilters_ui import Ui_animFiltersWindow
+except ImportError:
+	Ui_animFiltersWindow = None
 
 maya_useNewAPI = True
 
-
-def add_keys(anim_curve, key_dict):
-	# type: (unicode, dict) -> None
-	"""
-	Add keyframes to animation curve
-
-	:param anim_curve: animation curve name
-	:param key_dict: dictionary of keyframes in {frame_number (float): value (float)} format
-	:return: None
-	"""
-	#print(anim_curve)
-	#print(key_dict)
-	the_curve = anim_curve#.keys()[0]
-	for i in key_dict.keys():
-		thekey = runtime.addNewKey(the_curve,int(float(i)))
-		thekey.value = float(key_dict[i])
-
-
-def get_raw_curves():
-	result_curves = {}
-	track_view = runtime.trackviews.getTrackView(1)
-	if track_view :
-		select_num = track_view.numSelTracks()
-		if select_num > 0:
-		#for i in range(select_num):
-			track_obj = track_view.getSelected(1)
-			start = int(track_obj.keys[0].time.frame)
-			end = int(track_obj.keys[(len(track_obj.keys) - 1)].time.frame)
-			anim_dict = {}
-			for o in range(start, end + 1):
-				with pymxs.attime(o):
-					anim_dict[o] = track_obj.value
-			result_curves[track_obj] = anim_dict
-
-	#print(result_curves)
-	return result_curves
-
-
-def copy_original_curves():
-
-	start = 0 
-	end = 1
-	result_curves = {}
-	track_view = runtime.trackviews.getTrackView(1)
-	if track_view :
-		select_num = track_view.numSelTracks()
-		if select_num > 0:
-		#for i in range(select_num):
-			track_obj = track_view.getSelected(1)
-			count_ = runtime.numKeys(track_obj)
-			anim_dict = {}
-			for o in range(count_):
-				the_key = runtime.getKey(track_obj,(o + 1))
-				anim_dict[the_key.time.frame] = the_key.value
-				if the_key.time.frame < start :
-					start = the_key.time.frame
-				if the_key.time.frame > end :
-					end = the_key.time.frame
-			result_curves[track_obj] = anim_dict
-	else:
-		return None, None, None
-
-	return result_curves, start, end
-
-
-def paste_clipboard_curves(anim_curves, start, end):
-	# type: (list, float, float) -> None
-	"""
-	Paste original anim curves we stored when the preview button was pressed
-
-	:param anim_curves: list of animation curves
-	:param start: start frame
-	:param end: end frame
-	:return: None
-	"""
-	#cmds.pasteKey(anim_curves, t=(start, end), o="replace")
-	for the_curve in anim_curves:
-		try_deleteKeys(the_curve)
-		for i in (anim_curves[the_curve]).keys():
-			thekey = runtime.addNewKey(the_curve,int(i))
-			thekey.value = float(anim_curves[the_curve][i])
-	#print(anim_curves)
-	#pass
-
-def median_filter(raw_anim_curves, window_size=15):
-	if raw_anim_curves is None:
-		#cmds.headsUpMessage("No animation keys/curve selected! Select keys to filter, please!")
-		return
-	if window_size % 2 == 0:
-		window_size += 1
-	processed_curves = {}
-	for key in raw_anim_curves.keys():
-		start, end = min(raw_anim_curves[key]), max(raw_anim_curves[key])
-		x = []
-		for i in range(start, end):
-			x.append(raw_anim_curves[key][i])
-		y = medfilt(x, window_size)
-		processed_keys = {}
-		for i in range(start, end):
-			processed_keys[str(i)] = y[i - start]
-		processed_curves[key] = processed_keys
-	return processed_curves
-
-
-def butter_lowpass(cutoff, fs, order=5):
-	nyq = 0.5 * fs
-	# ensure cutoff frequency doesn't overflow sampling frequency
-	if cutoff > nyq:
-		cutoff = nyq
-	normal_cutoff = cutoff / nyq
-	b, a = butter(order, normal_cutoff, btype="low", analog=False)
-	return b, a
-
-
-def butter_lowpass_filter(data, cutoff, fs, order=5):
-	b, a = butter_lowpass(cutoff, fs, order=order)
-	padlen = 3 * max(len(a), len(b))
-
-	# Switch padding method based on time range length
-	if len(data) >= padlen:
-		y = filtfilt(b, a, data)
-	else:
-		y = filtfilt(b, a, data, method="gust")
-		#cmds.warning("Working on a short segment, selecting longer time range could improve results.")
-	return y
-
-
-def butterworth_filter(raw_anim_curves, fs=30.0, cutoff=5.0, order=5):
-	if raw_anim_curves is None:
-		#cmds.headsUpMessage("No animation keys/curve selected! Select keys to filter, please!")
-		return
-
-	processed_curves = {}
-	for key in raw_anim_curves.keys():
-
-		start, end = min(raw_anim_curves[key]), max(raw_anim_curves[key])
-		
-		x = []
-		T = (end - start)
-		nsamples = ((fs * T) / 30.0) + 1
-		t_space = np.linspace(start, end, nsamples, endpoint=True)
-		reached_end = False
-		for t_sample in t_space:
-			if int(t_sample) >= end and not reached_end:
-				value = raw_anim_curves[key][int(t_sample)]
-				reached_end = True
-			else:
-				value = raw_anim_curves[key][int(t_sample)] + (
-						raw_anim_curves[key][int(t_sample) + 1] - raw_anim_curves[key][int(t_sample)]) * (
-								t_sample - int(t_sample))
-			x.append(value)
-		y = butter_lowpass_filter(x, cutoff, fs, order)
-		processed_keys = {}
-		key_index = 0
-		for t_sample in t_space:
-			value = y[key_index]
-			processed_keys[str(t_sample)] = value
-			key_index += 1
-		processed_curves[key] = processed_keys
-	return processed_curves
-
-
-def resample_keys(kv, thresh):
-	start = float(min(kv.keys()))
-	end = float(max(kv.keys()))
-	startv = float(kv[start])
-	endv = float(kv[end])
-	total_error = 0
-	offender = -1
-	outlier = -1
-	for k, v in kv.items():
-		offset = (k - start) / (end - start)
-		sample = (offset * endv) + ((1 - offset) * startv)
-		delta = abs(v - sample)
-		total_error += delta
-		if delta > outlier:
-			outlier = delta
-			offender = k
-	if total_error < thresh or len(kv.keys()) == 2:
-		return [{start: startv, end: endv}]
-	else:
-		s1 = {kk: vv for kk, vv in kv.items() if kk <= offender}
-		s2 = {kk: vv for kk, vv in kv.items() if kk >= offender}
-		return resample_keys(s1, thresh) + resample_keys(s2, thresh)
-
-
-def rejoin_keys(kvs):
-	result = {}
-	for item in kvs:
-		result.update(item)
-	return result
-
-
-def decimate(keys, tolerance):
-	return rejoin_keys(resample_keys(keys, tolerance))
-
-
-def adaptive_filter(raw_anim_curves, tolerance_value):
-	processed_curves = {}
-	for key in raw_anim_curves.keys():
-		processed_keys = decimate(raw_anim_curves[key], tolerance_value)
-		processed_curves[key] = processed_keys
-	return processed_curves
-
-def try_deleteKeys(curve_name):
-	count_ = runtime.numKeys(curve_name)
-	for o in range((count_ - 1),1,-1):
-		runtime.deleteKey(curve_name,o)
-
-def apply_curves(original_curves, processed_curves=None):
-	for curve_name in original_curves.keys():
-		start, end = min(original_curves[curve_name]), max(original_curves[curve_name])
-		#cmds.cutKey(curve_name, time=(start + 0.001, end - 0.001), option="keys", cl=True)
-		##runtime.deleteKeys(curve_name)
-		try_deleteKeys(curve_name)
-		if processed_curves is not None:
-			#print(curve_name)
-			#print(processed_curves[curve_name])
-			add_keys(curve_name, processed_curves[curve_name])
-		else:
-			add_keys(curve_name, original_curves[curve_name])
+# default time in ms between a parameter change and the preview refresh
+REFRESH_LATENCY = 40
+# default memory budget of the processed preview cache in MB
+RESULT_CACHE_MB = 128
+# time in ms a preview write may take while a slider is dragged
+PROGRESSIVE_BUDGET = 16
+# rotating stage timing log, percentiles are written every TIMING_LOG_EVERY refreshes
+TIMING_LOG = os.path.join(os.path.expanduser("~"), "animFilters", "timing.jsonl")
+TIMING_LOG_EVERY = 50
 
 
 def select_curves(anim_curves, first_key_only=False):
@@ -279,6 +83,14 @@ def select_curves(anim_curves, first_key_only=False):
 
 def loadAnimFiltersUI(uifilename, parent=None):
 	"""Properly Loads and returns UI files - by BarryPye on stackOverflow"""
+	if compiledUIFresh(uifilename):
+		window = QtWidgets.QMainWindow(parent)
+		ui = Ui_animFiltersWindow()
+		ui.setupUi(window)
+		# widgets as attributes of the window, like QUiLoader returns them
+		for name, widget in vars(ui).items():
+			setattr(window, name, widget)
+		return window
 	loader = QtUiTools.QUiLoader()
 	uifile = QtCore.QFile(uifilename)
 	uifile.open(QtCore.QFile.ReadOnly)
@@ -287,6 +99,81 @@ def loadAnimFiltersUI(uifilename, parent=None):
 	return ui
 
 
+def compiledUIFresh(uifilename):
+	if Ui_animFiltersWindow is None:
+		return False
+	module = sys.modules[Ui_animFiltersWindow.__module__].__file__
+	# a .ui edited after the last build is loaded from the file
+	return os.path.getmtime(module) >= os.path.getmtime(uifilename)
+
+
+class RefreshScheduler(QtCore.QObject):
+	"""
+	Coalesces parameter changes into preview refreshes
+
+	Every change only marks the preview dirty, the refresh runs once the
+	latency target has passed since the first change of a burst and always
+	reads the current widget values, so intermediate values are skipped but
+	the last one is always rendered.
+	"""
+
+	def __init__(self, callback, latency=REFRESH_LATENCY, parent=None):
+		super(RefreshScheduler, self).__init__(parent)
+		self.callback = callback
+		self.pending = False
+		self.timer = QtCore.QTimer(self)
+		self.timer.setSingleShot(True)
+		self.timer.timeout.connect(self.flush)
+		self.setLatency(latency)
+
+	def setLatency(self, latency):
+		self.timer.setInterval(max(0, int(latency)))
+
+	def latency(self):
+		return self.timer.interval()
+
+	def request(self):
+		self.pending = True
+		# not restarted on later changes, a long drag still refreshes every latency ms
+		if not self.timer.isActive():
+			self.timer.start()
+
+	def flush(self):
+		self.timer.stop()
+		if self.pending:
+			self.pending = False
+			self.callback()
+
+	def cancel(self):
+		self.timer.stop()
+		self.pending = False
+
+
+class FilterResultRelay(QtCore.QObject):
+	"""
+	Hands filter worker results over to the UI thread through a queued signal
+	"""
+	resultReady = QtCore.Signal(object, object, object)
+
+	def deliver(self, generation, result, error):
+		self.resultReady.emit(generation, result, error)
+
+
+class WindowCloseFilter(QtCore.QObject):
+	"""
+	Calls back when the watched window is closed, the window is only hidden
+	"""
+
+	def __init__(self, callback, parent=None):
+		super(WindowCloseFilter, self).__init__(parent)
+		self.callback = callback
+
+	def eventFilter(self, watched, event):
+		if event.type() == QtCore.QEvent.Close:
+			self.callback()
+		return False
+
+
 class AnimFiltersUI(QtWidgets.QMainWindow):
 	def __init__(self):
 		mainUI = SCRIPT_LOC + "/animFilters.ui"
@@ -303,7 +190,11 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.MainWindowUI = loadAnimFiltersUI(mainUI, main_window)
 
 
-		self.MainWindowUI.setAttribute(QtCore.Qt.WA_DeleteOnClose, True)
+		# closing only hides the window so the next launch shows it again,
+		# it is destroyed together with the 3ds Max main window
+		self.windowAlive = True
+		self.closeFilter = WindowCloseFilter(self.onCloseCode, self.MainWindowUI)
+		self.MainWindowUI.installEventFilter(self.closeFilter)
 		self.MainWindowUI.destroyed.connect(self.onExitCode)
 		self.MainWindowUI.show()
 
@@ -338,6 +229,13 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.MainWindowUI.butterOrderSpinBox.valueChanged.connect(
 			partial(self.spinBoxChanged, self.MainWindowUI.butterOrderSlider, 1.0))
 
+		# while a slider is held the preview is written at display resolution
+		self.sliders = (self.MainWindowUI.thresholdSlider, self.MainWindowUI.multiSlider,
+						self.MainWindowUI.medianSlider, self.MainWindowUI.butterSampleFreqSlider,
+						self.MainWindowUI.butterCutoffFreqSlider, self.MainWindowUI.butterOrderSlider)
+		for slider in self.sliders:
+			slider.sliderReleased.connect(self.sliderReleased)
+
 		# connect buttons
 		self.MainWindowUI.previewButton.clicked.connect(self.previewFilter)
 		self.MainWindowUI.cancelButton.clicked.connect(self.cancelFilter)
@@ -346,14 +244,31 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.MainWindowUI.bufferCurvesCheckBox.stateChanged.connect(self.bufferCurvesChanged)
 
 		# initialize variables
+		self.host = MaxHost()
+		self.stageTimer = StageTimer()
+		self.timingLog = None
+		self.hostProfiler = None
+		self.previewWriter = PreviewWriter(self.host, self.stageTimer)
 		self.original_curves_keys = None 
 		self.animCurvesBuffer = None
 		self.animCurvesProcessed = None
+		self.decimationTrees = None
 		self.previewActive = False
 		self.start = None
 		self.end = None
 		self.originalCurves = None
 		self.bufferCurvesState = True
+		self.refreshScheduler = RefreshScheduler(self.refreshFilter, REFRESH_LATENCY, self)
+		# filters run on a worker thread, results come back queued to this thread
+		self.filterRelay = FilterResultRelay(self)
+		self.filterRelay.resultReady.connect(self.filterDone)
+		self.filterWorker = FilterWorker(self.filterRelay.deliver)
+		self.processedGeneration = None
+		# processed previews per (preview session, tab, parameters)
+		self.resultCache = ResultCache(RESULT_CACHE_MB * 1024 * 1024)
+		self.previewSession = 0
+		self.progressiveBudget = PROGRESSIVE_BUDGET
+		self.displaySamples = 2000
 		self.restoreSettings()
 
 	def restoreSettings(self):
@@ -366,6 +281,44 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		else:
 			self.MainWindowUI.bufferCurvesCheckBox.setChecked(strtobool(self.bufferCurvesState))
 
+		# preview refresh latency target in ms, only editable in the settings file
+		latency = self.settings.value("refreshLatency")
+		if latency is None:
+			self.settings.setValue("refreshLatency", self.refreshScheduler.latency())
+		else:
+			self.refreshScheduler.setLatency(int(latency))
+
+		cacheSize = self.settings.value("resultCacheMB")
+		if cacheSize is None:
+			self.settings.setValue("resultCacheMB", RESULT_CACHE_MB)
+		else:
+			self.resultCache.resize(int(cacheSize) * 1024 * 1024)
+
+		budget = self.settings.value("progressiveBudget")
+		if budget is None:
+			self.settings.setValue("progressiveBudget", self.progressiveBudget)
+		else:
+			self.progressiveBudget = float(budget)
+
+		# an empty path turns the timing log off
+		timingLog = self.settings.value("timingLog")
+		if timingLog is None:
+			timingLog = TIMING_LOG
+			self.settings.setValue("timingLog", timingLog)
+		if timingLog:
+			try:
+				self.timingLog = TimingLog(timingLog)
+			except (IOError, OSError):
+				self.timingLog = None
+
+		# host call counts per operation, printed to the listener, off by default
+		profileHost = self.settings.value("profileHost")
+		if profileHost is None:
+			self.settings.setValue("profileHost", False)
+		elif strtobool(str(profileHost)):
+			self.hostProfiler = HostProfiler()
+			self.hostProfiler.attach(self.host)
+
 	def bufferCurvesChanged(self):
 		self.bufferCurvesState = self.MainWindowUI.bufferCurvesCheckBox.isChecked()
 		self.settings.setValue("bufferCurves", self.bufferCurvesState)
@@ -383,28 +336,45 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 
 	# update spin box value when slider changes
 	def sliderChanged(self, target, multiplier, sliderValue):
+		# the partner is synced silently so a drag step is one parameter change
+		target.blockSignals(True)
 		target.setValue(sliderValue / multiplier)
+		target.blockSignals(False)
 		if self.previewActive:
-			self.refreshFilter()
+			self.refreshScheduler.request()
 
 	# update slider value when spin box value changes
 	def spinBoxChanged(self, target, multiplier, spinBoxValue):
+		target.blockSignals(True)
 		target.setValue(spinBoxValue * multiplier)
+		target.blockSignals(False)
 		if self.previewActive:
-			self.refreshFilter()
+			self.refreshScheduler.request()
+
+	# write the exact result once the drag is over
+	def sliderReleased(self):
+		if self.previewActive:
+			self.refreshScheduler.request()
+			self.refreshScheduler.flush()
+
+	def sliderHeld(self):
+		return any(slider.isSliderDown() for slider in self.sliders)
 
 	# grab anim curves when the preview button is pressed
 	def previewFilter(self):
 		if self.bufferCurvesState is True:
 			pass
 			#cmds.bufferCurve(animation='keys', overwrite=True)
-		self.originalCurves, self.start, self.end = copy_original_curves()
+		self.beginOperation("preview")
+		self.originalCurves, self.start, self.end = copy_original_curves(self.host, timer=self.stageTimer)
 		if self.originalCurves is None:
+			self.endOperation()
 			return
-		self.animCurvesBuffer = get_raw_curves()
+		self.animCurvesBuffer = get_raw_curves(self.host, self.stageTimer)
 		self.original_curves_keys = None
-		if self.animCurvesBuffer is None:
-			return
+		self.previewWriter.reset()
+		self.previewSession += 1
+		self.decimationTrees = None
 		#cmds.undoInfo(swf=False)
 		self.MainWindowUI.statusbar.showMessage("UNDO suspended in preview mode!!")
 		self.switchTabs(False)
@@ -412,22 +382,95 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.previewActive = True
 		self.refreshFilter()
 
+	# filter function, arguments and cache key for the current tab, widgets are only read here
+	def filterJob(self):
+		tab = self.MainWindowUI.tabWidget.currentIndex()
+		if tab == 0:
+			params = (self.MainWindowUI.thresholdSpinBox.value() * self.MainWindowUI.multiSpinBox.value(),)
+			func, args = self.adaptiveFilter, (self.animCurvesBuffer,) + params
+		elif tab == 1:
+			params = (self.MainWindowUI.butterSampleFreqSpinBox.value(),
+					  self.MainWindowUI.butterCutoffFreqSpinBox.value(),
+					  self.MainWindowUI.butterOrderSpinBox.value())
+			func, args = butterworth_filter, (self.animCurvesBuffer,) + params
+		else:
+			params = (self.MainWindowUI.medianSpinBox.value(),)
+			func, args = median_filter, (self.animCurvesBuffer,) + params
+		return func, args, (self.previewSession, tab, params)
+
+	# runs on the filter worker, the split hierarchy is built by the first
+	# adaptive job of a preview and tolerance changes only cut through it
+	def adaptiveFilter(self, curves, tolerance):
+		built = self.decimationTrees
+		if built is None or built[0] is not curves:
+			# keyed by the curves, a job of an older preview must not leave its trees behind
+			built = (curves, build_decimation_trees(curves))
+			self.decimationTrees = built
+		return adaptive_filter(curves, tolerance, built[1])
+
 	def refreshFilter(self):
-		if self.MainWindowUI.tabWidget.currentIndex() == 0:
-			self.animCurvesProcessed = adaptive_filter(self.animCurvesBuffer,
-													   self.MainWindowUI.thresholdSpinBox.value() *
-													   self.MainWindowUI.multiSpinBox.value())
-			apply_curves(self.animCurvesBuffer, self.animCurvesProcessed)
-		elif self.MainWindowUI.tabWidget.currentIndex() == 1:
-			self.animCurvesProcessed = butterworth_filter(self.animCurvesBuffer,
-														  self.MainWindowUI.butterSampleFreqSpinBox.value(),
-														  self.MainWindowUI.butterCutoffFreqSpinBox.value(),
-														  self.MainWindowUI.butterOrderSpinBox.value())
-			apply_curves(self.animCurvesBuffer, self.animCurvesProcessed)
-		elif self.MainWindowUI.tabWidget.currentIndex() == 2:
-			self.animCurvesProcessed = median_filter(self.animCurvesBuffer, self.MainWindowUI.medianSpinBox.value())
-			apply_curves(self.animCurvesBuffer, self.animCurvesProcessed)
-		select_curves(self.animCurvesProcessed, True)
+		func, args, key = self.filterJob()
+		cached = self.resultCache.get(key)
+		if cached is None:
+			# superseded results are still cached, scrubbing back to them is free
+			self.filterWorker.submit(timed, self.resultCache.fill, key, func, *args)
+			return
+		self.filterWorker.cancel()
+		self.showResult(self.filterWorker.generation, cached, 0.0)
+
+	# runs on the UI thread once the worker finished the latest job
+	def filterDone(self, generation, result, error):
+		if not self.previewActive or not self.filterWorker.is_current(generation):
+			return
+		if error is not None:
+			# the preview operation is still open when its first filter fails
+			if self.stageTimer.running:
+				self.endOperation()
+			self.MainWindowUI.statusbar.showMessage("Filter failed: %s" % error)
+			return
+		self.showResult(generation, *result)
+
+	def showResult(self, generation, result, filterSeconds):
+		self.animCurvesProcessed = result
+		self.processedGeneration = generation
+		# the first result of a preview completes its "preview" record
+		if not self.stageTimer.running:
+			self.beginOperation("refresh")
+		self.stageTimer.add("filter", filterSeconds)
+		if not self.sliderHeld():
+			apply_curves(self.host, self.animCurvesBuffer, self.animCurvesProcessed, self.previewWriter)
+			select_curves(self.animCurvesProcessed, True)
+		else:
+			# keep the write inside the frame budget by adapting the display resolution
+			start = time.time()
+			apply_curves(self.host, self.animCurvesBuffer, display_curves(result, self.displaySamples), self.previewWriter)
+			elapsed = max((time.time() - start) * 1000.0, 0.1)
+			scale = min(2.0, self.progressiveBudget / elapsed)
+			self.displaySamples = max(100, int(self.displaySamples * scale))
+		self.endOperation()
+		self.MainWindowUI.statusbar.showMessage("UNDO suspended in preview mode!!   " + self.stageTimer.summary())
+		if self.stageTimer.count % TIMING_LOG_EVERY == 0:
+			self.writeTimingLog()
+
+	def beginOperation(self, name):
+		self.stageTimer.begin(name)
+		if self.hostProfiler is not None:
+			self.hostProfiler.begin(name)
+
+	def endOperation(self):
+		self.stageTimer.end()
+		if self.hostProfiler is not None:
+			self.hostProfiler.end()
+
+	def writeTimingLog(self):
+		if self.timingLog is not None and self.stageTimer.count:
+			self.timingLog.write(self.stageTimer, machine=platform.node(), tool="animFilters")
+		# one host call report per preview session
+		if self.hostProfiler is not None and not self.previewActive:
+			report = self.hostProfiler.report()
+			if report:
+				print(report)
+			self.hostProfiler.reset()
 
 	def resetValues(self):
 		if self.MainWindowUI.tabWidget.currentIndex() == 0:
@@ -441,7 +484,11 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 			self.MainWindowUI.medianSpinBox.setValue(35)
 
 	def cancelFilter(self):
-		paste_clipboard_curves(self.originalCurves, self.start, self.end)
+		self.refreshScheduler.cancel()
+		self.filterWorker.cancel()
+		self.beginOperation("cancel")
+		paste_clipboard_curves(self.host, self.originalCurves, self.start, self.end, self.stageTimer)
+		self.endOperation()
 		
 		select_curves(self.animCurvesBuffer)
 		
@@ -449,15 +496,28 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.switchTabs(True)
 		self.animCurvesBuffer = None
 		self.animCurvesProcessed = None
+		self.decimationTrees = None
+		self.previewWriter.reset()
+		self.resultCache.clear()
+		self.releaseOriginals()
 		self.previewActive = False
 		#cmds.undoInfo(swf=True)
-		self.MainWindowUI.statusbar.showMessage("")
+		self.MainWindowUI.statusbar.showMessage(self.stageTimer.summary())
+		self.writeTimingLog()
 
 	def applyFilter(self):
+		# make sure the last parameter change is what gets applied
+		self.refreshScheduler.flush()
+		self.beginOperation("apply")
+		if self.processedGeneration != self.filterWorker.generation:
+			func, args, key = self.filterJob()
+			self.filterWorker.cancel()
+			with self.stageTimer.span("filter"):
+				self.animCurvesProcessed = self.resultCache.compute(key, func, *args)
 		# apply original curve for undo step
 		#cmds.undoInfo(openChunk=True)
 		try:
-			apply_curves(self.animCurvesBuffer)
+			apply_curves(self.host, self.animCurvesBuffer, timer=self.stageTimer)
 		finally:
 			pass
 			#cmds.undoInfo(closeChunk=True)
@@ -465,7 +525,7 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		#cmds.undoInfo(swf=True)
 		#cmds.undoInfo(openChunk=True)
 		try:
-			apply_curves(self.animCurvesBuffer, self.animCurvesProcessed)
+			apply_curves(self.host, self.animCurvesBuffer, self.animCurvesProcessed, timer=self.stageTimer)
 			select_curves(self.animCurvesBuffer)
 		finally:
 			pass
@@ -474,24 +534,76 @@ class AnimFiltersUI(QtWidgets.QMainWindow):
 		self.switchTabs(True)
 		self.animCurvesBuffer = None
 		self.animCurvesProcessed = None
+		self.decimationTrees = None
+		self.previewWriter.reset()
+		self.resultCache.clear()
+		self.releaseOriginals()
 		self.previewActive = False
-		self.MainWindowUI.statusbar.showMessage("")
+		self.endOperation()
+		self.MainWindowUI.statusbar.showMessage(self.stageTimer.summary())
+		self.writeTimingLog()
+
+	# drop the original key snapshots, removes their temporary file if they spilled
+	def releaseOriginals(self):
+		if self.originalCurves is not None:
+			self.originalCurves.close()
+		self.originalCurves = None
 
-	def onExitCode(self):
+	# put back the curves of an open preview and drop the preview state
+	def closePreview(self):
 		if self.previewActive:
-			paste_clipboard_curves(self.originalCurves, self.start, self.end)
-			#apply_curves(self.animCurvesBuffer)
+			self.beginOperation("close")
+			paste_clipboard_curves(self.host, self.originalCurves, self.start, self.end, self.stageTimer)
+			self.endOperation()
+			#apply_curves(self.host, self.animCurvesBuffer)
 			#select_curves(self.animCurvesBuffer)
 		self.animCurvesBuffer = None
 		self.animCurvesProcessed = None
+		self.decimationTrees = None
+		self.previewWriter.reset()
+		self.resultCache.clear()
+		self.releaseOriginals()
+		self.previewActive = False
+
+	def showWindow(self):
+		self.MainWindowUI.showNormal()
+		self.MainWindowUI.raise_()
+		self.MainWindowUI.activateWindow()
+
+	# the window was closed by the user, it is kept for the next launch
+	def onCloseCode(self):
+		self.refreshScheduler.cancel()
+		self.filterWorker.cancel()
+		self.closePreview()
+		self.switchButtons(False)
+		self.switchTabs(True)
+		self.writeTimingLog()
+
+	def onExitCode(self):
+		self.windowAlive = False
+		self.refreshScheduler.cancel()
+		self.filterWorker.stop()
+		self.closePreview()
+		self.writeTimingLog()
+		if self.timingLog is not None:
+			self.timingLog.close()
+		if self.hostProfiler is not None:
+			self.hostProfiler.detach(self.host)
 		#cmds.undoInfo(swf=True)
 
 
+# the tool window of this session, reused by every launch
+window = None
+
+
 def main():
 	"""Command within Maya to run this script"""
+	global window
 	#if not (cmds.window("animFiltersWindow", exists=True)):
-	AnimFiltersUI()
-	#else:
-	#	sys.stdout.write("Tool is already open!\n")
+	if window is None or not window.windowAlive:
+		window = AnimFiltersUI()
+	else:
+		window.showWindow()
+	return window
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,224 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .curves import CurveBuffer
+
+
+class FilterDesignCache(object):
+	"""
+	Bounded LRU cache of low pass designs in second-order sections form
+
+	Designing the filter is the same for every curve of a refresh, so it is
+	done once per (cutoff, fs, order). The returned arrays are shared between
+	callers and must not be modified. Safe to use from the filter worker
+	thread and the UI thread at the same time.
+	"""
+
+	def __init__(self, maxsize=32):
+		# type: (int) -> None
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._designs = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._designs)
+
+	def get(self, cutoff, fs, order):
+		# type: (float, float, int) -> np.ndarray
+		"""
+		Return the SOS coefficients for a low pass filter, designing it if needed
+
+		:param cutoff: cutoff frequency
+		:param fs: sample frequency
+		:param order: filter order
+		:return: (n_sections, 6) array
+		"""
+		key = (float(cutoff), float(fs), int(order))
+		with self._lock:
+			sos = self._designs.pop(key, None)
+			if sos is None:
+				self.misses += 1
+				sos = _design_lowpass(*key)
+				while len(self._designs) >= self.maxsize:
+					self._designs.popitem(last=False)
+			else:
+				self.hits += 1
+			self._designs[key] = sos
+		return sos
+
+	def clear(self):
+		with self._lock:
+			self._designs.clear()
+			self.hits = 0
+			self.misses = 0
+
+
+def _design_lowpass(cutoff, fs, order):
+	# type: (float, float, int) -> np.ndarray
+	# scipy.signal takes about a second to import, it is only loaded once a
+	# filter is designed so opening the tool does not pay for it
+	from scipy.signal import butter
+	nyq = 0.5 * fs
+	# ensure cutoff frequency doesn't overflow sampling frequency
+	if cutoff > nyq:
+		cutoff = nyq
+	normal_cutoff = cutoff / nyq
+	return butter(order, normal_cutoff, btype="low", analog=False, output="sos")
+
+
+design_cache = FilterDesignCache()
+
+
+def butter_lowpass(cutoff, fs, order=5):
+	# type: (float, float, int) -> np.ndarray
+	"""
+	Cached Butterworth low pass design
+
+	:return: second-order sections coefficients
+	"""
+	return design_cache.get(cutoff, fs, order)
+
+
+def sos_padlen(sos):
+	# type: (np.ndarray) -> int
+	"""
+	Default edge padding used by sosfiltfilt for a design
+	"""
+	return 3 * (2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum()))
+
+
+def butter_lowpass_filter(data, cutoff, fs, order=5):
+	# type: (np.ndarray, float, float, int) -> np.ndarray
+	"""
+	Zero phase Butterworth low pass
+
+	:param data: samples to filter, filtering runs along the last axis
+	:param cutoff: cutoff frequency
+	:param fs: sample frequency
+	:param order: filter order
+	:return: filtered samples
+	"""
+	from scipy.signal import filtfilt, sos2tf, sosfiltfilt
+	sos = butter_lowpass(cutoff, fs, order=order)
+
+	# Switch padding method based on time range length
+	if np.shape(data)[-1] > sos_padlen(sos):
+		return sosfiltfilt(sos, data)
+	# Gustafsson's method is only available for transfer functions, short
+	# segments are cheap enough to filter that way
+	b, a = sos2tf(sos)
+	return filtfilt(b, a, data, method="gust")
+
+
+# samples filtered at a time by butter_lowpass_stream
+STREAM_BLOCK = 1 << 16
+
+
+def butter_lowpass_stream(data, cutoff, fs, order=5, block_size=STREAM_BLOCK, out=None):
+	# type: (np.ndarray, float, float, int, int, np.ndarray) -> np.ndarray
+	"""
+	Zero phase Butterworth low pass with memory bounded by the block size
+
+	Same result as butter_lowpass_filter (up to rounding) for 1D samples,
+	without materializing the padded signal and its temporaries. The forward
+	pass writes into out block by block, the backward pass runs over out in
+	reverse, both carry the filter state across block boundaries. data and
+	out may be memory mapped, out may be data itself.
+
+	:param data: 1D samples
+	:param cutoff: cutoff frequency
+	:param fs: sample frequency
+	:param order: filter order
+	:param block_size: samples per block
+	:param out: float64 array of len(data) for the result, allocated when None
+	:return: out
+	"""
+	from scipy.signal import sosfilt, sosfilt_zi
+	sos = butter_lowpass(cutoff, fs, order=order)
+	count = data.shape[0]
+	padlen = sos_padlen(sos)
+	if out is None:
+		out = np.empty(count)
+	if count <= padlen:
+		out[:] = butter_lowpass_filter(np.asarray(data, dtype=np.float64), cutoff, fs, order)
+		return out
+	block_size = max(1, int(block_size))
+
+	# odd extension of both ends like sosfiltfilt, read before out overwrites data
+	left = 2.0 * float(data[0]) - np.asarray(data[padlen:0:-1], dtype=np.float64)
+	right = 2.0 * float(data[-1]) - np.asarray(data[-2:-padlen - 2:-1], dtype=np.float64)
+	zi = sosfilt_zi(sos)
+
+	_, state = sosfilt(sos, left, zi=zi * left[0])
+	for start in range(0, count, block_size):
+		stop = min(start + block_size, count)
+		out[start:stop], state = sosfilt(sos, np.asarray(data[start:stop], dtype=np.float64), zi=state)
+	tail, state = sosfilt(sos, right, zi=state)
+
+	# the backward pass starts at the end of the extension and stops at the
+	# first sample, the left extension is never needed again
+	_, state = sosfilt(sos, tail[::-1], zi=zi * tail[-1])
+	for stop in range(count, 0, -block_size):
+		start = max(stop - block_size, 0)
+		filtered, state = sosfilt(sos, out[start:stop][::-1], zi=state)
+		out[start:stop] = filtered[::-1]
+	return out
+
+
+def resample_times(start, end, fs, scene_fps=30.0):
+	# type: (float, float, float, float) -> np.ndarray
+	"""
+	Sample times covering [start, end] at the filter sample rate
+
+	:param start: first frame
+	:param end: last frame
+	:param fs: filter sample frequency
+	:param scene_fps: scene frame rate
+	:return: evenly spaced times including both ends
+	"""
+	nsamples = int(((fs * (end - start)) / scene_fps) + 1)
+	return np.linspace(start, end, nsamples, endpoint=True)
+
+
+def butterworth_curve(curve, cutoff, fs, order=5, scene_fps=30.0):
+	# type: (CurveBuffer, float, float, int, float) -> CurveBuffer
+	"""
+	Butterworth low pass of a per frame sampled curve
+
+	The frames are linearly resampled to the filter rate, filtered and
+	interpolated back onto the original frames. Both resampling steps are
+	skipped when the filter runs at the scene rate.
+
+	:param curve: curve sampled on every frame
+	:param cutoff: cutoff frequency
+	:param fs: filter sample frequency
+	:param order: filter order
+	:param scene_fps: scene frame rate
+	:return: filtered curve on the original frames
+	"""
+	if fs == scene_fps:
+		return CurveBuffer(curve.times, butter_lowpass_filter(curve.values, cutoff, fs, order))
+	t_space = resample_times(curve.start, curve.end, fs, scene_fps)
+	x = np.interp(t_space, curve.times, curve.values)
+	y = butter_lowpass_filter(x, cutoff, fs, order)
+	return CurveBuffer(curve.times, np.interp(curve.times, t_space, y))
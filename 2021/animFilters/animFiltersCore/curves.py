@@ -0,0 +1,106 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+class CurveBuffer(object):
+	"""
+	Animation curve stored as two contiguous float64 arrays (times and values)
+
+	Buffers handed out by the host readers are read-only views, filters always
+	return new buffers so the original samples can be shared between the
+	preview, apply and cancel paths without copying.
+	"""
+	__slots__ = ("times", "values")
+
+	def __init__(self, times, values):
+		# type: (np.ndarray, np.ndarray) -> None
+		self.times = np.ascontiguousarray(times, dtype=np.float64)
+		self.values = np.ascontiguousarray(values, dtype=np.float64)
+		if self.times.shape != self.values.shape or self.times.ndim != 1:
+			raise ValueError("Curve times and values must be 1D arrays of the same length")
+
+	@classmethod
+	def from_samples(cls, start, values):
+		# type: (float, list) -> CurveBuffer
+		"""
+		Build a buffer from values sampled on every frame starting at start
+
+		:param start: frame of the first sample
+		:param values: sequence of per frame values
+		:return: new curve buffer
+		"""
+		values = np.ascontiguousarray(values, dtype=np.float64)
+		return cls(np.arange(values.shape[0], dtype=np.float64) + start, values)
+
+	@classmethod
+	def from_dict(cls, key_dict):
+		# type: (dict) -> CurveBuffer
+		"""
+		Build a buffer from a {frame: value} dictionary, keys may be strings
+
+		:param key_dict: dictionary of keyframes
+		:return: new curve buffer sorted by time
+		"""
+		times = np.fromiter((float(t) for t in key_dict.keys()), dtype=np.float64, count=len(key_dict))
+		values = np.fromiter((float(v) for v in key_dict.values()), dtype=np.float64, count=len(key_dict))
+		order = np.argsort(times, kind="mergesort")
+		return cls(times[order], values[order])
+
+	def __len__(self):
+		return self.times.shape[0]
+
+	def __repr__(self):
+		if not len(self):
+			return "CurveBuffer(empty)"
+		return "CurveBuffer(%d keys, %g-%g)" % (len(self), self.start, self.end)
+
+	@property
+	def start(self):
+		return float(self.times[0])
+
+	@property
+	def end(self):
+		return float(self.times[-1])
+
+	def readonly(self):
+		# type: () -> CurveBuffer
+		"""
+		Return a buffer sharing memory with this one that cannot be modified
+		"""
+		times = self.times.view()
+		values = self.values.view()
+		times.flags.writeable = False
+		values.flags.writeable = False
+		return CurveBuffer(times, values)
+
+	def snapped(self):
+		# type: () -> CurveBuffer
+		"""
+		Keys as the host ends up with them: times truncated to whole frames and
+		the last value winning when several keys land on the same frame
+		"""
+		times = np.trunc(self.times)
+		times, last = np.unique(times[::-1], return_index=True)
+		return CurveBuffer(times, self.values[::-1][last])
+
+	def to_dict(self):
+		# type: () -> dict
+		"""
+		Convert to the legacy {frame: value} dictionary
+		"""
+		return dict(zip(self.times.tolist(), self.values.tolist()))
@@ -0,0 +1,631 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import numpy as np
+
+from .curves import CurveBuffer
+from .snapshots import KeySnapshot
+
+
+class CurveHost(object):
+	"""
+	Access to the animation curves of a host application
+
+	Tracks are opaque handles returned by selected_tracks. Every write keeps
+	the first and last key of a track in place and replaces the keys between
+	them, which is what the filters expect when they write a preview.
+	"""
+
+	def selected_tracks(self):
+		# type: () -> list
+		"""
+		:return: handles of the selected animation tracks
+		"""
+		raise NotImplementedError
+
+	def track_name(self, track):
+		# type: (object) -> str
+		return str(track)
+
+	def read_keys(self, track):
+		# type: (object) -> CurveBuffer
+		"""
+		:return: key times and values of a track
+		"""
+		raise NotImplementedError
+
+	def sample_values(self, track, start=None, end=None):
+		# type: (object, int, int) -> CurveBuffer
+		"""
+		Evaluate a track on every frame, by default between its first and last key
+
+		:return: per frame samples
+		"""
+		raise NotImplementedError
+
+	def delete_keys(self, track):
+		# type: (object) -> None
+		"""
+		Delete every key except the first and the last one
+		"""
+		raise NotImplementedError
+
+	def write_keys(self, track, curve):
+		# type: (object, CurveBuffer) -> None
+		"""
+		Replace the keys of a track, keys are snapped to whole frames
+		"""
+		self.delete_keys(track)
+		self.add_keys(track, curve)
+
+	def add_keys(self, track, curve):
+		# type: (object, CurveBuffer) -> None
+		"""
+		Add keys or overwrite the value of keys already on those frames
+		"""
+		raise NotImplementedError
+
+	def edit_keys(self, track, curve, deleted, changed):
+		# type: (object, CurveBuffer, np.ndarray, CurveBuffer) -> None
+		"""
+		Apply a minimal edit script, see pipeline.PreviewWriter
+
+		:param curve: complete new key set, for hosts that cannot edit in place
+		:param deleted: whole frame times of the keys to delete
+		:param changed: keys to insert or whose value to update
+		"""
+		raise NotImplementedError
+
+	def snapshot(self, track):
+		# type: (object) -> KeySnapshot
+		"""
+		:return: key state that restore can put back
+		"""
+		return KeySnapshot.from_curve(self.read_keys(track))
+
+	def restore(self, track, snapshot):
+		# type: (object, KeySnapshot) -> None
+		self.write_keys(track, snapshot.curve())
+
+	# Batch versions of the calls above. Hosts that can move several tracks
+	# in one round trip override these, the defaults go track by track.
+
+	def sample_tracks(self, tracks):
+		# type: (list) -> list
+		"""
+		:return: per frame samples of every track between its first and last key
+		"""
+		return [self.sample_values(track) for track in tracks]
+
+	def snapshot_tracks(self, tracks):
+		# type: (list) -> list
+		return [self.snapshot(track) for track in tracks]
+
+	def restore_tracks(self, items):
+		# type: (list) -> None
+		"""
+		:param items: (track, snapshot) pairs
+		"""
+		for track, snapshot in items:
+			self.restore(track, snapshot)
+
+	def write_tracks(self, items):
+		# type: (list) -> None
+		"""
+		:param items: (track, CurveBuffer) pairs
+		"""
+		for track, curve in items:
+			self.write_keys(track, curve)
+
+	def edit_tracks(self, items):
+		# type: (list) -> None
+		"""
+		:param items: (track, curve, deleted, changed) tuples, see edit_keys
+		"""
+		for track, curve, deleted, changed in items:
+			self.edit_keys(track, curve, deleted, changed)
+
+
+class FakeHost(CurveHost):
+	"""
+	In-memory host used to profile the preview/apply pipeline outside a DCC
+
+	Keys are stored per track name and evaluated with linear interpolation.
+	Every simulated host round trip is counted and can cost latency seconds,
+	the number of round trips per operation follows the 3ds Max host (with or
+	without its bulk MAXScript helpers).
+	"""
+
+	def __init__(self, tracks=None, latency=0.0, selection=None, bulk=True):
+		# type: (dict, float, list, bool) -> None
+		self.tracks = {}
+		for name, curve in (tracks or {}).items():
+			self.tracks[name] = CurveBuffer(curve.times, curve.values)
+		self.selection = list(self.tracks.keys()) if selection is None else list(selection)
+		self.latency = latency
+		self.bulk = bulk
+		self.calls = 0
+
+	def _round_trip(self, count=1):
+		# type: (int) -> None
+		self.calls += count
+		if self.latency > 0.0 and count:
+			# sleep() is far too coarse for microsecond latencies
+			deadline = time.time() + self.latency * count
+			while time.time() < deadline:
+				pass
+
+	def selected_tracks(self):
+		self._round_trip(1 if self.bulk else 1 + len(self.selection))
+		return list(self.selection)
+
+	def read_keys(self, track):
+		curve = self.tracks[track]
+		self._round_trip(1 if self.bulk else 1 + len(curve))
+		return CurveBuffer(curve.times, curve.values)
+
+	def sample_values(self, track, start=None, end=None):
+		curve = self._sample(track, start, end)
+		self._round_trip(1 if self.bulk else len(curve))
+		return curve
+
+	def delete_keys(self, track):
+		curve = self.tracks[track]
+		self._round_trip(1 if self.bulk else 1 + max(len(curve) - 2, 0))
+		self._delete(track)
+
+	def add_keys(self, track, curve):
+		self._round_trip(1 if self.bulk else 2 * len(curve))
+		self._add(track, curve)
+
+	def write_keys(self, track, curve):
+		if not self.bulk:
+			return super(FakeHost, self).write_keys(track, curve)
+		self._round_trip(1)
+		self._delete(track)
+		self._add(track, curve)
+
+	def edit_keys(self, track, curve, deleted, changed):
+		self._round_trip(1 if self.bulk else 2 * (len(deleted) + len(changed)))
+		self._edit(track, deleted, changed)
+
+	def sample_tracks(self, tracks):
+		if not self.bulk:
+			return super(FakeHost, self).sample_tracks(tracks)
+		self._round_trip(1)
+		return [self._sample(track) for track in tracks]
+
+	def snapshot_tracks(self, tracks):
+		if not self.bulk:
+			return super(FakeHost, self).snapshot_tracks(tracks)
+		self._round_trip(1)
+		return [KeySnapshot.from_curve(self.tracks[track]) for track in tracks]
+
+	def restore(self, track, snapshot):
+		self._round_trip(1 if self.bulk else 1 + 2 * len(snapshot))
+		self.tracks[track] = snapshot.curve()
+
+	def restore_tracks(self, items):
+		if not self.bulk:
+			return super(FakeHost, self).restore_tracks(items)
+		self._round_trip(1)
+		for track, snapshot in items:
+			self.tracks[track] = snapshot.curve()
+
+	def write_tracks(self, items):
+		if not self.bulk:
+			return super(FakeHost, self).write_tracks(items)
+		self._round_trip(1)
+		for track, curve in items:
+			self._delete(track)
+			self._add(track, curve)
+
+	def edit_tracks(self, items):
+		if not self.bulk:
+			return super(FakeHost, self).edit_tracks(items)
+		self._round_trip(1)
+		for track, curve, deleted, changed in items:
+			self._edit(track, deleted, changed)
+
+	def _sample(self, track, start=None, end=None):
+		curve = self.tracks[track]
+		start = int(curve.start) if start is None else int(start)
+		end = int(curve.end) if end is None else int(end)
+		frames = np.arange(start, end + 1, dtype=np.float64)
+		return CurveBuffer(frames, np.interp(frames, curve.times, curve.values))
+
+	def _edit(self, track, deleted, changed):
+		current = self.tracks[track]
+		keep = ~np.isin(current.times, deleted)
+		self.tracks[track] = CurveBuffer(current.times[keep], current.values[keep])
+		self._add(track, changed)
+
+	def _delete(self, track):
+		curve = self.tracks[track]
+		if len(curve) > 2:
+			self.tracks[track] = CurveBuffer(curve.times[[0, -1]], curve.values[[0, -1]])
+
+	def _add(self, track, curve):
+		current = self.tracks[track]
+		curve = curve.snapped()
+		keep = ~np.isin(current.times, curve.times)
+		merged_times = np.concatenate((current.times[keep], curve.times))
+		merged_values = np.concatenate((current.values[keep], curve.values))
+		order = np.argsort(merged_times, kind="mergesort")
+		self.tracks[track] = CurveBuffer(merged_times[order], merged_values[order])
+
+
+# per key columns of a 3ds Max snapshot, tangent types are 1 based indices
+# into animFilters_tangentTypes and 0 for keys without bezier tangents
+MAX_KEY_FIELDS = ("time", "value", "inTangent", "outTangent", "inTangentType", "outTangentType",
+				  "inTangentLength", "outTangentLength")
+
+# MAXScript side of the bulk MaxHost calls. Each function handles a whole
+# track, reads return a flat array and writes take packed time/value arrays,
+# so reading or writing a track is a single round trip instead of one per
+# frame or per key. The *Tracks variants do the same for a list of tracks,
+# with per track counts in front of (reads) or next to (writes) the data.
+MAXSCRIPT_HELPERS = """
+global animFilters_tangentTypes = #(#smooth, #linear, #step, #fast, #slow, #custom, #auto)
+
+fn animFilters_selectedTracks tv =
+(
+	for i = 1 to tv.numSelTracks() collect (tv.getSelected i)
+)
+
+fn animFilters_sampleTrack ctrl startFrame endFrame =
+(
+	for f = startFrame to endFrame collect (at time f ctrl.value)
+)
+
+fn animFilters_readKeys ctrl =
+(
+	local result = #()
+	local count = numKeys ctrl
+	result.count = 2 * count
+	for i = 1 to count do
+	(
+		local k = getKey ctrl i
+		result[2 * i - 1] = k.time.frame
+		result[2 * i] = k.value
+	)
+	result
+)
+
+fn animFilters_deleteKeys ctrl =
+(
+	for i = (numKeys ctrl) - 1 to 2 by -1 do deleteKey ctrl i
+	ok
+)
+
+fn animFilters_addKeys ctrl times vals =
+(
+	for i = 1 to times.count do
+	(
+		local k = addNewKey ctrl times[i]
+		k.value = vals[i]
+	)
+	ok
+)
+
+fn animFilters_writeKeys ctrl times vals =
+(
+	animFilters_deleteKeys ctrl
+	animFilters_addKeys ctrl times vals
+)
+
+fn animFilters_editKeys ctrl deleted times vals =
+(
+	for t in deleted do
+	(
+		local i = getKeyIndex ctrl t
+		if i > 0 do deleteKey ctrl i
+	)
+	animFilters_addKeys ctrl times vals
+)
+
+fn animFilters_sampleTracks ctrls =
+(
+	local result = #()
+	for ctrl in ctrls do
+	(
+		local count = numKeys ctrl
+		if count == 0 then
+			join result #(0, 0)
+		else
+		(
+			local startFrame = (getKeyTime ctrl 1).frame as integer
+			local endFrame = (getKeyTime ctrl count).frame as integer
+			append result startFrame
+			append result (endFrame - startFrame + 1)
+			join result (animFilters_sampleTrack ctrl startFrame endFrame)
+		)
+	)
+	result
+)
+
+fn animFilters_snapshotTracks ctrls =
+(
+	local result = #()
+	for ctrl in ctrls do
+	(
+		local count = numKeys ctrl
+		append result count
+		for i = 1 to count do
+		(
+			local k = getKey ctrl i
+			append result k.time.frame
+			append result k.value
+			if isProperty k #inTangentType then
+				join result #(k.inTangent, k.outTangent,
+					findItem animFilters_tangentTypes k.inTangentType,
+					findItem animFilters_tangentTypes k.outTangentType,
+					k.inTangentLength, k.outTangentLength)
+			else
+				join result #(0, 0, 0, 0, 0, 0)
+		)
+	)
+	result
+)
+
+fn animFilters_restoreTracks ctrls counts keys =
+(
+	local offset = 0
+	for c = 1 to ctrls.count do
+	(
+		local ctrl = ctrls[c]
+		deleteKeys ctrl #allKeys
+		for i = 1 to counts[c] do
+		(
+			local k = addNewKey ctrl keys[offset + 1]
+			k.value = keys[offset + 2]
+			local inType = keys[offset + 5] as integer
+			local outType = keys[offset + 6] as integer
+			if inType > 0 and outType > 0 and isProperty k #inTangentType do
+			(
+				k.inTangentType = animFilters_tangentTypes[inType]
+				k.outTangentType = animFilters_tangentTypes[outType]
+				k.inTangent = keys[offset + 3]
+				k.outTangent = keys[offset + 4]
+				k.inTangentLength = keys[offset + 7]
+				k.outTangentLength = keys[offset + 8]
+			)
+			offset += 8
+		)
+	)
+	ok
+)
+
+fn animFilters_writeTracks ctrls counts times vals =
+(
+	local offset = 0
+	for c = 1 to ctrls.count do
+	(
+		local n = counts[c]
+		animFilters_deleteKeys ctrls[c]
+		for i = offset + 1 to offset + n do
+		(
+			local k = addNewKey ctrls[c] times[i]
+			k.value = vals[i]
+		)
+		offset += n
+	)
+	ok
+)
+
+fn animFilters_editTracks ctrls deletedCounts deleted counts times vals =
+(
+	local deletedOffset = 0
+	local offset = 0
+	for c = 1 to ctrls.count do
+	(
+		local ctrl = ctrls[c]
+		for i = deletedOffset + 1 to deletedOffset + deletedCounts[c] do
+		(
+			local index = getKeyIndex ctrl deleted[i]
+			if index > 0 do deleteKey ctrl index
+		)
+		deletedOffset += deletedCounts[c]
+		for i = offset + 1 to offset + counts[c] do
+		(
+			local k = addNewKey ctrl times[i]
+			k.value = vals[i]
+		)
+		offset += counts[c]
+	)
+	ok
+)
+"""
+
+
+def _packed_keys(curve):
+	# type: (CurveBuffer) -> tuple
+	"""
+	Whole frame times and values as plain lists, ready to become MAXScript arrays
+	"""
+	return curve.times.astype(np.int64).tolist(), curve.values.tolist()
+
+
+def _packed_tracks(curves):
+	# type: (list) -> tuple
+	"""
+	Per curve key counts plus the concatenated whole frame times and values
+	"""
+	counts = [len(curve) for curve in curves]
+	if not curves:
+		return counts, [], []
+	times = np.concatenate([curve.times for curve in curves]).astype(np.int64)
+	values = np.concatenate([curve.values for curve in curves])
+	return counts, times.tolist(), values.tolist()
+
+
+class MaxHost(CurveHost):
+	"""
+	3ds Max host working on the tracks selected in the first Track View
+
+	With bulk enabled tracks are read and written through MAXScript helpers
+	defined once per session, otherwise every frame and key goes through pymxs.
+	"""
+	_helpers_loaded = False
+
+	def __init__(self, max_tracks=None, bulk=True):
+		# type: (int, bool) -> None
+		import pymxs
+		self.mxs = pymxs
+		self.runtime = pymxs.runtime
+		self.max_tracks = max_tracks
+		self.bulk = bulk
+		if bulk:
+			self.load_helpers()
+
+	def load_helpers(self, force=False):
+		# type: (bool) -> None
+		if force or not MaxHost._helpers_loaded:
+			self.runtime.execute(MAXSCRIPT_HELPERS)
+			MaxHost._helpers_loaded = True
+
+	def selected_tracks(self):
+		track_view = self.runtime.trackviews.getTrackView(1)
+		if not track_view:
+			return None
+		if self.bulk:
+			tracks = list(self.runtime.animFilters_selectedTracks(track_view))
+		else:
+			tracks = [track_view.getSelected(i) for i in range(1, track_view.numSelTracks() + 1)]
+		if self.max_tracks is not None:
+			tracks = tracks[:self.max_tracks]
+		return tracks
+
+	def read_keys(self, track):
+		if self.bulk:
+			flat = np.array(list(self.runtime.animFilters_readKeys(track)), dtype=np.float64)
+			return CurveBuffer(flat[0::2], flat[1::2])
+		count_ = self.runtime.numKeys(track)
+		times = np.empty(count_)
+		values = np.empty(count_)
+		for o in range(count_):
+			the_key = self.runtime.getKey(track, (o + 1))
+			times[o] = the_key.time.frame
+			values[o] = the_key.value
+		return CurveBuffer(times, values)
+
+	def sample_values(self, track, start=None, end=None):
+		if start is None:
+			start = int(track.keys[0].time.frame)
+		if end is None:
+			end = int(track.keys[(len(track.keys) - 1)].time.frame)
+		if self.bulk:
+			return CurveBuffer.from_samples(start, list(self.runtime.animFilters_sampleTrack(track, start, end)))
+		samples = []
+		for o in range(start, end + 1):
+			with self.mxs.attime(o):
+				samples.append(track.value)
+		return CurveBuffer.from_samples(start, samples)
+
+	def delete_keys(self, track):
+		if self.bulk:
+			self.runtime.animFilters_deleteKeys(track)
+			return
+		count_ = self.runtime.numKeys(track)
+		for o in range((count_ - 1), 1, -1):
+			self.runtime.deleteKey(track, o)
+
+	def add_keys(self, track, curve):
+		if self.bulk:
+			self.runtime.animFilters_addKeys(track, *_packed_keys(curve))
+			return
+		for t, v in zip(curve.times.tolist(), curve.values.tolist()):
+			thekey = self.runtime.addNewKey(track, int(t))
+			thekey.value = v
+
+	def write_keys(self, track, curve):
+		if self.bulk:
+			self.runtime.animFilters_writeKeys(track, *_packed_keys(curve))
+			return
+		super(MaxHost, self).write_keys(track, curve)
+
+	def edit_keys(self, track, curve, deleted, changed):
+		if self.bulk:
+			self.runtime.animFilters_editKeys(track, deleted.astype(np.int64).tolist(), *_packed_keys(changed))
+			return
+		for t in deleted.astype(np.int64).tolist():
+			index = self.runtime.getKeyIndex(track, t)
+			if index > 0:
+				self.runtime.deleteKey(track, index)
+		self.add_keys(track, changed)
+
+	def sample_tracks(self, tracks):
+		if not self.bulk:
+			return super(MaxHost, self).sample_tracks(tracks)
+		flat = np.array(list(self.runtime.animFilters_sampleTracks(list(tracks))), dtype=np.float64)
+		curves = []
+		offset = 0
+		for _ in tracks:
+			start, count = int(flat[offset]), int(flat[offset + 1])
+			offset += 2
+			curves.append(CurveBuffer.from_samples(start, flat[offset:offset + count]))
+			offset += count
+		return curves
+
+	def snapshot(self, track):
+		if not self.bulk:
+			return super(MaxHost, self).snapshot(track)
+		return self.snapshot_tracks([track])[0]
+
+	def restore(self, track, snapshot):
+		if not self.bulk:
+			return super(MaxHost, self).restore(track, snapshot)
+		self.restore_tracks([(track, snapshot)])
+
+	def snapshot_tracks(self, tracks):
+		if not self.bulk:
+			return super(MaxHost, self).snapshot_tracks(tracks)
+		flat = np.array(list(self.runtime.animFilters_snapshotTracks(list(tracks))), dtype=np.float64)
+		width = len(MAX_KEY_FIELDS)
+		snapshots = []
+		offset = 0
+		for _ in tracks:
+			count = int(flat[offset])
+			snapshots.append(KeySnapshot(MAX_KEY_FIELDS, flat[offset + 1:offset + 1 + width * count]))
+			offset += 1 + width * count
+		return snapshots
+
+	def restore_tracks(self, items):
+		if not self.bulk:
+			return super(MaxHost, self).restore_tracks(items)
+		tracks = [track for track, snapshot in items]
+		counts = [len(snapshot) for track, snapshot in items]
+		keys = np.concatenate([snapshot.keys.ravel() for track, snapshot in items]) if items else np.empty(0)
+		self.runtime.animFilters_restoreTracks(tracks, counts, keys.tolist())
+
+	def write_tracks(self, items):
+		if not self.bulk:
+			return super(MaxHost, self).write_tracks(items)
+		tracks = [track for track, curve in items]
+		self.runtime.animFilters_writeTracks(tracks, *_packed_tracks([curve for track, curve in items]))
+
+	def edit_tracks(self, items):
+		if not self.bulk:
+			return super(MaxHost, self).edit_tracks(items)
+		tracks = [item[0] for item in items]
+		deleted = [item[2] for item in items]
+		deleted_counts = [len(d) for d in deleted]
+		deleted = np.concatenate(deleted).astype(np.int64).tolist() if deleted else []
+		self.runtime.animFilters_editTracks(tracks, deleted_counts, deleted,
+											*_packed_tracks([item[3] for item in items]))
+
@@ -0,0 +1,178 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .curves import CurveBuffer
+from .snapshots import SnapshotStore
+from .timing import NULL_TIMER
+
+# tracks per bulk snapshot/restore call, bounds the memory of one host call
+SNAPSHOT_CHUNK = 64
+
+
+class PreviewWriter(object):
+	"""
+	Writes preview results by sending the host only what changed
+
+	The first write of a track replaces its keys as usual, later writes diff
+	the new result against the keys written last time and send an edit script
+	of deletions, insertions and value updates. The first and last key of the
+	sampled range are never deleted, matching CurveHost.write_keys.
+
+	Anything that changes the keys behind the writer's back (restore, undo)
+	has to be followed by reset. Diffing and host calls are reported to the
+	timer as the diff and write stages.
+	"""
+
+	def __init__(self, host, timer=None):
+		# type: (CurveHost, StageTimer) -> None
+		self.host = host
+		self.timer = timer or NULL_TIMER
+		self._written = {}
+
+	def reset(self):
+		self._written = {}
+
+	def write(self, track, curve, original):
+		# type: (object, CurveBuffer, CurveBuffer) -> None
+		"""
+		:param track: host track
+		:param curve: keys to show
+		:param original: per frame samples the keys were computed from
+		"""
+		self.write_tracks([(track, curve, original)])
+
+	def write_tracks(self, items):
+		# type: (list) -> None
+		"""
+		Write several tracks with at most one full write and one edit batch
+
+		:param items: (track, curve, original) tuples, see write
+		"""
+		writes = []
+		edits = []
+		with self.timer.span("diff"):
+			for track, curve, original in items:
+				new = curve.snapped()
+				previous = self._written.get(track)
+				self._written[track] = new
+				if previous is None:
+					writes.append((track, curve))
+					continue
+				deleted = previous.times[~np.isin(previous.times, new.times)]
+				if len(original):
+					bounds = (np.trunc(original.start), np.trunc(original.end))
+					deleted = deleted[~np.isin(deleted, bounds)]
+				stale = np.ones(len(new), dtype=bool)
+				if len(previous):
+					index = np.minimum(np.searchsorted(previous.times, new.times), len(previous) - 1)
+					stale = (previous.times[index] != new.times) | (previous.values[index] != new.values)
+				if len(deleted) or stale.any():
+					edits.append((track, curve, deleted, CurveBuffer(new.times[stale], new.values[stale])))
+		with self.timer.span("write"):
+			if writes:
+				self.host.write_tracks(writes)
+			if edits:
+				self.host.edit_tracks(edits)
+
+
+def get_raw_curves(host, timer=None):
+	# type: (CurveHost, StageTimer) -> dict
+	"""
+	Sample every selected track on each frame between its first and last key
+
+	:param host: curve host
+	:param timer: optional stage timer, reported as read
+	:return: {track: CurveBuffer} read-only per frame samples
+	"""
+	with (timer or NULL_TIMER).span("read"):
+		tracks = host.selected_tracks() or []
+		samples = host.sample_tracks(tracks)
+	result_curves = {}
+	for track, curve in zip(tracks, samples):
+		result_curves[track] = curve.readonly()
+	return result_curves
+
+
+def copy_original_curves(host, spill_bytes=64 * 1024 * 1024, timer=None):
+	# type: (CurveHost, int, StageTimer) -> tuple
+	"""
+	Store the keys of the selected tracks so we can put them back later
+
+	:param host: curve host
+	:param spill_bytes: snapshots past this size go to a temporary file
+	:param timer: optional stage timer, reported as read
+	:return: SnapshotStore, start frame, end frame
+	"""
+	with (timer or NULL_TIMER).span("read"):
+		tracks = host.selected_tracks()
+		if tracks is None:
+			return None, None, None
+		start = 0
+		end = 1
+		store = SnapshotStore(spill_bytes)
+		for i in range(0, len(tracks), SNAPSHOT_CHUNK):
+			chunk = tracks[i:i + SNAPSHOT_CHUNK]
+			for track, snapshot in zip(chunk, host.snapshot_tracks(chunk)):
+				store.add(track, snapshot)
+				if len(snapshot):
+					start = min(start, snapshot.start)
+					end = max(end, snapshot.end)
+	return store, start, end
+
+
+def paste_clipboard_curves(host, anim_curves, start, end, timer=None):
+	# type: (CurveHost, dict, float, float, StageTimer) -> None
+	"""
+	Paste original anim curves we stored when the preview button was pressed
+
+	:param host: curve host
+	:param anim_curves: SnapshotStore from copy_original_curves
+	:param start: start frame
+	:param end: end frame
+	:param timer: optional stage timer, reported as restore
+	:return: None
+	"""
+	tracks = list(anim_curves)
+	with (timer or NULL_TIMER).span("restore"):
+		for i in range(0, len(tracks), SNAPSHOT_CHUNK):
+			host.restore_tracks([(track, anim_curves[track]) for track in tracks[i:i + SNAPSHOT_CHUNK]])
+
+
+def apply_curves(host, original_curves, processed_curves=None, writer=None, timer=None):
+	# type: (CurveHost, dict, dict, PreviewWriter, StageTimer) -> None
+	"""
+	Write the processed curves, or the original samples when there are none
+
+	:param host: curve host
+	:param original_curves: {track: CurveBuffer} per frame samples
+	:param processed_curves: {track: CurveBuffer} filter result
+	:param writer: optional preview writer, only changed keys are sent
+	:param timer: optional stage timer for full writes, reported as write
+	:return: None
+	"""
+	items = []
+	for track in original_curves.keys():
+		if processed_curves is not None:
+			items.append((track, processed_curves[track], original_curves[track]))
+		else:
+			items.append((track, original_curves[track], original_curves[track]))
+	if writer is not None:
+		writer.write_tracks(items)
+		return
+	with (timer or NULL_TIMER).span("write"):
+		host.write_tracks([item[:2] for item in items])
@@ -0,0 +1,164 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import json
+import struct
+
+import numpy as np
+
+from .curves import CurveBuffer
+
+# Take archive layout, all numbers little endian:
+#   magic, padded to ALIGN bytes
+#   per track: times then values as float64, each block starting on ALIGN
+#   index: utf-8 JSON {"tracks": [[name, offset, count], ...]}
+#   trailer: uint64 index offset, magic
+# The index is written last so archives can be streamed track by track.
+MAGIC = b"AFTAKE01"
+ALIGN = 64
+_TRAILER = struct.Struct("<Q8s")
+
+
+def _pad(f):
+	position = f.tell()
+	if position % ALIGN:
+		f.write(b"\0" * (ALIGN - position % ALIGN))
+	return f.tell()
+
+
+class ArchiveWriter(object):
+	"""
+	Streams curves into a take archive, close() writes the index
+	"""
+
+	def __init__(self, path):
+		# type: (str) -> None
+		self.path = path
+		self._index = []
+		self._names = set()
+		self._file = open(path, "wb")
+		self._file.write(MAGIC)
+		_pad(self._file)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def add(self, name, curve):
+		# type: (str, CurveBuffer) -> None
+		if name in self._names:
+			raise ValueError("Track %s is already in the archive" % name)
+		offset = _pad(self._file)
+		self._file.write(np.ascontiguousarray(curve.times, dtype="<f8").tobytes())
+		_pad(self._file)
+		self._file.write(np.ascontiguousarray(curve.values, dtype="<f8").tobytes())
+		self._index.append([name, offset, len(curve)])
+		self._names.add(name)
+
+	def close(self):
+		if self._file is None:
+			return
+		index_offset = _pad(self._file)
+		self._file.write(json.dumps({"tracks": self._index}).encode("utf-8"))
+		self._file.write(_TRAILER.pack(index_offset, MAGIC))
+		self._file.close()
+		self._file = None
+
+
+def write_archive(path, curves):
+	# type: (str, dict) -> None
+	"""
+	:param curves: {track name: CurveBuffer}
+	"""
+	with ArchiveWriter(path) as writer:
+		for name in sorted(curves.keys()):
+			writer.add(name, curves[name])
+
+
+def _values_offset(offset, count):
+	end = offset + 8 * count
+	return end + (-end % ALIGN)
+
+
+class TakeArchive(object):
+	"""
+	Read-only, memory mapped take archive
+
+	Curves are zero copy views into the mapping, only the pages of the tracks
+	that are actually used get read from disk.
+	"""
+
+	def __init__(self, path):
+		# type: (str) -> None
+		self.path = path
+		self._map = np.memmap(path, dtype=np.uint8, mode="r")
+		if self._map.shape[0] < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)].tobytes() != MAGIC:
+			raise ValueError("%s is not an animFilters take archive" % path)
+		index_offset, magic = _TRAILER.unpack(self._map[-_TRAILER.size:].tobytes())
+		if magic != MAGIC:
+			raise ValueError("%s is truncated, the archive index is missing" % path)
+		index = json.loads(self._map[index_offset:-_TRAILER.size].tobytes().decode("utf-8"))
+		self._tracks = []
+		self._entries = {}
+		for name, offset, count in index["tracks"]:
+			self._tracks.append(name)
+			self._entries[name] = (offset, count)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def __len__(self):
+		return len(self._tracks)
+
+	def __contains__(self, name):
+		return name in self._entries
+
+	def __iter__(self):
+		return iter(self._tracks)
+
+	def __repr__(self):
+		return "TakeArchive(%s, %d tracks)" % (self.path, len(self))
+
+	def tracks(self):
+		return list(self._tracks)
+
+	keys = tracks
+
+	def __getitem__(self, name):
+		# type: (str) -> CurveBuffer
+		offset, count = self._entries[name]
+		data = self._map
+		times = data[offset:offset + 8 * count].view("<f8")
+		start = _values_offset(offset, count)
+		values = data[start:start + 8 * count].view("<f8")
+		return CurveBuffer(times, values)
+
+	def curves(self, names=None):
+		# type: (list) -> dict
+		"""
+		:param names: tracks to map, all of them by default
+		:return: {track name: CurveBuffer} read-only views
+		"""
+		return dict((name, self[name]) for name in (self._tracks if names is None else names))
+
+	def close(self):
+		# views handed out keep the mapping alive until they are released
+		self._map = None
@@ -0,0 +1,120 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import OrderedDict
+
+
+def result_nbytes(result):
+	# type: (dict) -> int
+	"""
+	:param result: {track: CurveBuffer} filter result
+	:return: bytes held by the curve arrays
+	"""
+	return sum(curve.times.nbytes + curve.values.nbytes for curve in result.values())
+
+
+class ResultCache(object):
+	"""
+	Byte bounded LRU cache of processed curves
+
+	Keys are (source, filter, parameters) tuples where source identifies the
+	raw curves the result was computed from. Cached results are shared and
+	must be treated as read-only. Safe to use from the filter worker thread
+	and the UI thread at the same time.
+	"""
+
+	def __init__(self, max_bytes=128 * 1024 * 1024):
+		# type: (int) -> None
+		self.max_bytes = max_bytes
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._results = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._results)
+
+	def __repr__(self):
+		return "ResultCache(%d results, %.1f/%.1f MB, %d hits, %d misses, %d evictions)" % (
+			len(self), self.nbytes / 1048576.0, self.max_bytes / 1048576.0, self.hits, self.misses, self.evictions)
+
+	def get(self, key):
+		# type: (tuple) -> dict
+		"""
+		:return: cached result or None, a hit marks the entry as recently used
+		"""
+		with self._lock:
+			entry = self._results.pop(key, None)
+			if entry is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self._results[key] = entry
+			return entry[0]
+
+	def put(self, key, result):
+		# type: (tuple, dict) -> None
+		"""
+		Store a result, evicting the least recently used ones to stay under max_bytes
+		"""
+		size = result_nbytes(result)
+		with self._lock:
+			old = self._results.pop(key, None)
+			if old is not None:
+				self.nbytes -= old[1]
+			if size > self.max_bytes:
+				return
+			while self._results and self.nbytes + size > self.max_bytes:
+				self.nbytes -= self._results.popitem(last=False)[1][1]
+				self.evictions += 1
+			self._results[key] = (result, size)
+			self.nbytes += size
+
+	def compute(self, key, func, *args):
+		# type: (tuple, callable, ...) -> dict
+		"""
+		Return the cached result for key or store func(*args)
+		"""
+		result = self.get(key)
+		if result is None:
+			result = self.fill(key, func, *args)
+		return result
+
+	def fill(self, key, func, *args):
+		# type: (tuple, callable, ...) -> dict
+		"""
+		Store and return func(*args) for a key whose get already missed,
+		without counting a second miss
+		"""
+		result = func(*args)
+		self.put(key, result)
+		return result
+
+	def resize(self, max_bytes):
+		# type: (int) -> None
+		with self._lock:
+			self.max_bytes = max_bytes
+			while self._results and self.nbytes > self.max_bytes:
+				self.nbytes -= self._results.popitem(last=False)[1][1]
+				self.evictions += 1
+
+	def clear(self):
+		with self._lock:
+			self._results.clear()
+			self.nbytes = 0
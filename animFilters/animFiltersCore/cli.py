@@ -0,0 +1,213 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Filter exported curve files without 3ds Max
+
+    cd animFilters
+    python -m animFiltersCore.cli take01.csv takes/ -f median:35 -f adaptive:0.25 -o cleaned/ [-j 8]
+
+Filters run in the given order: median:WINDOW, butterworth:FS,CUTOFF[,ORDER]
+and adaptive:TOLERANCE. Every file is split into groups of tracks and the
+groups are filtered on a process pool. Workers map take archives themselves
+and only read the tracks of their group.
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from .archive import TakeArchive
+from .curvefiles import FORMATS, file_format, read_curves, write_curves
+from .curves import CurveBuffer
+from .filters import adaptive_filter, butterworth_filter, median_filter
+
+try:
+	_cpu_time = time.process_time
+except AttributeError:
+	_cpu_time = time.clock
+
+# name: (argument types, required argument count)
+FILTERS = {
+	"median": ((int,), 1),
+	"butterworth": ((float, float, int), 2),
+	"adaptive": ((float,), 1),
+}
+
+
+def parse_filter(text):
+	# type: (str) -> tuple
+	"""
+	:param text: "name:arg,arg"
+	:return: (name, args)
+	"""
+	name, _, args = text.partition(":")
+	name = name.strip().lower()
+	if name not in FILTERS:
+		raise ValueError("Unknown filter %s, expected one of %s" % (name, ", ".join(sorted(FILTERS))))
+	types, required = FILTERS[name]
+	args = [a for a in args.split(",") if a.strip()]
+	if not required <= len(args) <= len(types):
+		raise ValueError("Filter %s takes %d to %d arguments" % (name, required, len(types)))
+	return name, tuple(t(a) for t, a in zip(types, args))
+
+
+def per_frame(curves):
+	# type: (dict) -> dict
+	"""
+	Resample curves that are not keyed on every frame, the frame filters expect that
+	"""
+	result = {}
+	for key in curves.keys():
+		curve = curves[key]
+		if len(curve) < 2:
+			result[key] = curve
+			continue
+		frames = np.arange(np.ceil(curve.start), np.floor(curve.end) + 1)
+		if frames.shape == curve.times.shape and np.array_equal(frames, curve.times):
+			result[key] = curve
+		else:
+			result[key] = CurveBuffer(frames, np.interp(frames, curve.times, curve.values))
+	return result
+
+
+def run_chain(curves, chain):
+	# type: (dict, list) -> dict
+	"""
+	Apply the filters of chain one after another
+
+	:param curves: {track: CurveBuffer}
+	:param chain: (name, args) pairs from parse_filter
+	:return: {track: CurveBuffer}
+	"""
+	for name, args in chain:
+		if name == "adaptive":
+			curves = adaptive_filter(curves, *args)
+			continue
+		curves = per_frame(curves)
+		if name == "butterworth":
+			curves = butterworth_filter(curves, *args)
+			continue
+		filtered = median_filter(curves, *args)
+		# median_filter leaves the last frame to the host, put it back
+		for key in filtered.keys():
+			curve = curves[key]
+			filtered[key] = CurveBuffer(np.append(filtered[key].times, curve.times[-1:]),
+										np.append(filtered[key].values, curve.values[-1:]))
+		curves = filtered
+	return curves
+
+
+def _filter_task(task):
+	# type: (tuple) -> tuple
+	path, group, arrays, chain = task
+	start = _cpu_time()
+	if isinstance(arrays, list):
+		curves = TakeArchive(path).curves(arrays)
+	else:
+		curves = dict((track, CurveBuffer(times, values)) for track, (times, values) in arrays.items())
+	frames = sum(len(curve) for curve in curves.values())
+	result = run_chain(curves, chain)
+	arrays = dict((track, (curve.times, curve.values)) for track, curve in result.items())
+	return path, group, arrays, frames, _cpu_time() - start
+
+
+def _curve_files(inputs):
+	for path in inputs:
+		if not os.path.isdir(path):
+			yield path
+			continue
+		for name in sorted(os.listdir(path)):
+			if os.path.splitext(name)[1].lower().lstrip(".") in FORMATS:
+				yield os.path.join(path, name)
+
+
+def _tasks(paths, chain, group_size, counts):
+	for path in paths:
+		archive = file_format(path) == "take"
+		curves = TakeArchive(path) if archive else read_curves(path)
+		tracks = sorted(curves.keys())
+		groups = [tracks[i:i + group_size] for i in range(0, len(tracks), group_size)] or [[]]
+		counts[path] = len(groups)
+		for group, names in enumerate(groups):
+			if archive:
+				# track names only, the worker maps the archive
+				yield path, group, names, chain
+				continue
+			arrays = dict((track, (curves[track].times, curves[track].values)) for track in names)
+			yield path, group, arrays, chain
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("inputs", nargs="+", help="curve files or folders of them (%s)" % ", ".join(FORMATS))
+	parser.add_argument("-f", "--filter", action="append", required=True, type=parse_filter, dest="chain",
+						help="median:WINDOW, butterworth:FS,CUTOFF[,ORDER] or adaptive:TOLERANCE, repeat to chain")
+	parser.add_argument("-o", "--output-dir", required=True)
+	parser.add_argument("--format", choices=FORMATS, help="output format, default same as the input")
+	parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count())
+	parser.add_argument("--group-size", type=int, default=64, help="tracks per pool task")
+	args = parser.parse_args(argv)
+
+	paths = list(_curve_files(args.inputs))
+	for path in paths:
+		file_format(path)
+	if not os.path.isdir(args.output_dir):
+		os.makedirs(args.output_dir)
+
+	counts = {}
+	pending = {}
+	frames = 0
+	cpu = 0.0
+	start = time.time()
+	tasks = _tasks(paths, args.chain, max(1, args.group_size), counts)
+	pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+	try:
+		results = pool.imap_unordered(_filter_task, tasks) if pool is not None else (_filter_task(t) for t in tasks)
+		for path, group, arrays, task_frames, task_cpu in results:
+			frames += task_frames
+			cpu += task_cpu
+			done = pending.setdefault(path, [])
+			done.append(arrays)
+			if len(done) < counts[path]:
+				continue
+			curves = {}
+			for arrays in pending.pop(path):
+				for track, (times, values) in arrays.items():
+					curves[track] = CurveBuffer(times, values)
+			name = os.path.basename(path)
+			if args.format:
+				name = os.path.splitext(name)[0] + "." + args.format
+			write_curves(os.path.join(args.output_dir, name), curves)
+			print("%s: %d tracks" % (name, len(curves)))
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+	wall = time.time() - start
+	jobs = max(1, args.jobs)
+	print("%d files, %d frames in %.2fs on %d processes: %.0f frames/s per core (%.0f frames per cpu second)" % (
+		len(paths), frames, wall, jobs, frames / max(wall, 1e-9) / jobs, frames / max(cpu, 1e-9)))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,179 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+
+# host API modules a CurveHost keeps as attributes, see hosts.py
+HOST_APIS = ("runtime", "mxs")
+_PLAIN = (bool, int, float, str, type(None))
+
+
+def _call_site(depth):
+	# type: (int) -> str
+	frame = sys._getframe(depth + 1)
+	owner = frame.f_locals.get("self")
+	name = frame.f_code.co_name
+	if owner is not None:
+		name = "%s.%s" % (type(owner).__name__, name)
+	return "%s:%d" % (name, frame.f_lineno)
+
+
+class _ProfiledCall(object):
+	"""
+	Callable host API entry point that reports every call to the profiler
+	"""
+	__slots__ = ("_target", "_profiler", "_name")
+
+	def __init__(self, target, profiler, name):
+		self._target = target
+		self._profiler = profiler
+		self._name = name
+
+	def __call__(self, *args, **kwargs):
+		start = time.time()
+		try:
+			return self._target(*args, **kwargs)
+		finally:
+			self._profiler.record(self._name, _call_site(1), 1, time.time() - start)
+
+	def __getattr__(self, name):
+		return getattr(self._target, name)
+
+
+class _ProfiledApi(object):
+	"""
+	Stand-in for pymxs or pymxs.runtime whose functions are counted
+	"""
+	__slots__ = ("_target", "_profiler", "_name")
+
+	def __init__(self, target, profiler, name):
+		self._target = target
+		self._profiler = profiler
+		self._name = name
+
+	def __getattr__(self, name):
+		value = getattr(self._target, name)
+		qualified = "%s.%s" % (self._name, name)
+		if callable(value):
+			return _ProfiledCall(value, self._profiler, qualified)
+		if isinstance(value, _PLAIN):
+			return value
+		# structs like runtime.trackviews, their functions are host calls too
+		return _ProfiledApi(value, self._profiler, qualified)
+
+
+class HostProfiler(object):
+	"""
+	Opt-in counter of host API calls per operation and call site
+
+	attach() swaps the host API modules of a CurveHost for counting
+	stand-ins (and the simulated round trips of FakeHost), begin/end group
+	the calls into operations such as Preview or Cancel. Only calls made
+	through those modules are seen, not property reads or methods of the host
+	objects they return (track.value, track.keys).
+	"""
+
+	def __init__(self):
+		self.operation = None
+		self._operations = []
+		self._stats = {}
+		self._attached = {}
+
+	def attach(self, host):
+		# type: (CurveHost) -> CurveHost
+		originals = {}
+		for api in HOST_APIS:
+			target = host.__dict__.get(api)
+			if target is not None:
+				originals[api] = target
+				setattr(host, api, _ProfiledApi(target, self, api))
+		round_trip = host.__dict__.get("_round_trip") or getattr(host, "_round_trip", None)
+		if round_trip is not None:
+			profiler = self
+
+			def counted_round_trip(count=1):
+				start = time.time()
+				round_trip(count)
+				profiler.record("round trip", _call_site(1), count, time.time() - start)
+			originals["_round_trip"] = host.__dict__.get("_round_trip")
+			host._round_trip = counted_round_trip
+		self._attached[id(host)] = originals
+		return host
+
+	def detach(self, host):
+		# type: (CurveHost) -> None
+		for api, target in self._attached.pop(id(host), {}).items():
+			if target is None:
+				del host.__dict__[api]
+			else:
+				setattr(host, api, target)
+
+	def begin(self, operation):
+		# type: (str) -> None
+		self.operation = operation
+		if operation not in self._stats:
+			self._operations.append(operation)
+			self._stats[operation] = {}
+
+	def end(self):
+		operation = self.operation
+		self.operation = None
+		return operation
+
+	def record(self, api, site, count, seconds):
+		# type: (str, str, int, float) -> None
+		stats = self._stats.get(self.operation)
+		if stats is None:
+			self.begin(self.operation or "other")
+			stats = self._stats[self.operation]
+		entry = stats.get((api, site))
+		if entry is None:
+			stats[(api, site)] = [count, seconds]
+		else:
+			entry[0] += count
+			entry[1] += seconds
+
+	def totals(self, operation):
+		# type: (str) -> tuple
+		"""
+		:return: (host calls, seconds) of an operation
+		"""
+		entries = self._stats.get(operation, {}).values()
+		return sum(e[0] for e in entries), sum(e[1] for e in entries)
+
+	def report(self, operation=None, top=10):
+		# type: (str, int) -> str
+		"""
+		"Preview: 48,213 host calls, 3.1 s" per operation followed by its
+		busiest call sites
+
+		:param operation: only this operation, all of them by default
+		:param top: call sites listed per operation
+		"""
+		lines = []
+		for name in ([operation] if operation else self._operations):
+			calls, seconds = self.totals(name)
+			lines.append("%s: %s host calls, %.1f s" % (name.capitalize(), format(calls, ","), seconds))
+			sites = sorted(self._stats.get(name, {}).items(), key=lambda item: (-item[1][1], -item[1][0]))
+			for (api, site), (count, spent) in sites[:top]:
+				lines.append("  %10s  %8.3f s  %-32s %s" % (format(count, ","), spent, api, site))
+		return "\n".join(lines)
+
+	def reset(self):
+		self.operation = None
+		self._operations = []
+		self._stats = {}
@@ -0,0 +1,157 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+import numpy as np
+
+from .curves import CurveBuffer
+
+# key layout of hosts that only know times and values
+CURVE_FIELDS = ("time", "value")
+
+
+class KeySnapshot(object):
+	"""
+	Complete key state of one track as a (keys, fields) float64 matrix
+
+	The first two fields are always time and value, hosts append whatever
+	else they need to put a key back exactly (tangents, tangent types).
+	"""
+	__slots__ = ("fields", "keys")
+
+	def __init__(self, fields, keys):
+		# type: (tuple, np.ndarray) -> None
+		self.fields = tuple(fields)
+		self.keys = np.asarray(keys, dtype=np.float64).reshape(-1, len(self.fields))
+		if self.fields[:2] != CURVE_FIELDS:
+			raise ValueError("Snapshot fields must start with time and value")
+
+	@classmethod
+	def from_curve(cls, curve):
+		# type: (CurveBuffer) -> KeySnapshot
+		return cls(CURVE_FIELDS, np.column_stack((curve.times, curve.values)))
+
+	def __len__(self):
+		return self.keys.shape[0]
+
+	def __repr__(self):
+		return "KeySnapshot(%d keys, %s)" % (len(self), ", ".join(self.fields))
+
+	@property
+	def times(self):
+		return self.keys[:, 0]
+
+	@property
+	def values(self):
+		return self.keys[:, 1]
+
+	@property
+	def start(self):
+		return float(self.keys[0, 0])
+
+	@property
+	def end(self):
+		return float(self.keys[-1, 0])
+
+	@property
+	def nbytes(self):
+		return self.keys.nbytes
+
+	def curve(self):
+		# type: () -> CurveBuffer
+		return CurveBuffer(self.times, self.values)
+
+
+class SnapshotStore(object):
+	"""
+	{track: KeySnapshot} that moves snapshots to a temporary file past a memory budget
+
+	Spilled snapshots are read back as read-only memory maps, so restoring a
+	large selection never needs all of it in memory at once. close() removes
+	the file.
+	"""
+
+	def __init__(self, spill_bytes=64 * 1024 * 1024):
+		# type: (int) -> None
+		self.spill_bytes = spill_bytes
+		self.nbytes = 0
+		self._order = []
+		self._memory = {}
+		self._spilled = {}
+		self._path = None
+		self._file = None
+
+	def __len__(self):
+		return len(self._order)
+
+	def __iter__(self):
+		return iter(self._order)
+
+	def __contains__(self, track):
+		return track in self._memory or track in self._spilled
+
+	def __repr__(self):
+		return "SnapshotStore(%d tracks, %d spilled)" % (len(self), len(self._spilled))
+
+	def keys(self):
+		return list(self._order)
+
+	def add(self, track, snapshot):
+		# type: (object, KeySnapshot) -> None
+		if track not in self:
+			self._order.append(track)
+		if self.nbytes + snapshot.nbytes <= self.spill_bytes:
+			self._memory[track] = snapshot
+			self.nbytes += snapshot.nbytes
+			return
+		if self._file is None:
+			handle, self._path = tempfile.mkstemp(prefix="animFilters_", suffix=".snapshot")
+			self._file = os.fdopen(handle, "w+b")
+		self._file.seek(0, os.SEEK_END)
+		offset = self._file.tell()
+		self._file.write(np.ascontiguousarray(snapshot.keys).tobytes())
+		self._spilled[track] = (snapshot.fields, offset, len(snapshot))
+
+	def __getitem__(self, track):
+		# type: (object) -> KeySnapshot
+		if track in self._memory:
+			return self._memory[track]
+		fields, offset, count = self._spilled[track]
+		if not count:
+			return KeySnapshot(fields, np.empty((0, len(fields))))
+		self._file.flush()
+		keys = np.memmap(self._path, dtype=np.float64, mode="r", offset=offset, shape=(count, len(fields)))
+		return KeySnapshot(fields, keys)
+
+	def items(self):
+		return [(track, self[track]) for track in self._order]
+
+	def close(self):
+		self._memory = {}
+		self._spilled = {}
+		self._order = []
+		self.nbytes = 0
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+			try:
+				os.remove(self._path)
+			except OSError:
+				# still mapped on Windows, the temp folder cleanup gets it
+				pass
+			self._path = None
@@ -0,0 +1,193 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import logging.handlers
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+STAGES = ("read", "filter", "diff", "write", "restore")
+PERCENTILES = (50, 90, 99)
+
+
+def timed(func, *args):
+	# type: (callable, ...) -> tuple
+	"""
+	:return: (func(*args), seconds it took)
+	"""
+	start = time.time()
+	result = func(*args)
+	return result, time.time() - start
+
+
+class _Span(object):
+	__slots__ = ("timer", "stage", "start")
+
+	def __init__(self, timer, stage):
+		self.timer = timer
+		self.stage = stage
+
+	def __enter__(self):
+		self.start = time.time()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.timer.add(self.stage, time.time() - self.start)
+
+
+class StageTimer(object):
+	"""
+	Per stage latency of preview operations
+
+	Spans opened between begin and end add up into one record per operation
+	(a Preview, a refresh, a Cancel). The last record can be shown to the
+	user, every stage also keeps a rolling window of its recent durations for
+	percentiles. All times are kept in seconds.
+	"""
+
+	def __init__(self, window=200):
+		# type: (int) -> None
+		self.window = window
+		self.last = None
+		self.count = 0
+		self._current = None
+		self._history = {}
+
+	@property
+	def running(self):
+		return self._current is not None
+
+	def begin(self, operation):
+		# type: (str) -> None
+		self._current = {"operation": operation, "stages": {}}
+
+	def span(self, stage):
+		# type: (str) -> _Span
+		"""
+		Context manager timing one stage of the current operation
+		"""
+		return _Span(self, stage)
+
+	def add(self, stage, seconds):
+		# type: (str, float) -> None
+		if self._current is None:
+			return
+		stages = self._current["stages"]
+		stages[stage] = stages.get(stage, 0.0) + seconds
+
+	def end(self):
+		# type: () -> dict
+		"""
+		Close the current operation
+
+		:return: {"operation": name, "stages": {stage: seconds}, "total": seconds}
+		"""
+		record = self._current
+		if record is None:
+			return None
+		self._current = None
+		record["total"] = sum(record["stages"].values())
+		for stage, seconds in record["stages"].items():
+			self._history.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+		self.last = record
+		self.count += 1
+		return record
+
+	def summary(self, record=None):
+		# type: (dict) -> str
+		"""
+		:return: "read 12 ms | filter 40 ms | ..." of the last operation
+		"""
+		record = record or self.last
+		if not record:
+			return ""
+		stages = record["stages"]
+		ordered = [s for s in STAGES if s in stages] + sorted(s for s in stages if s not in STAGES)
+		return " | ".join("%s %.1f ms" % (stage, stages[stage] * 1000.0) for stage in ordered)
+
+	def percentiles(self):
+		# type: () -> dict
+		"""
+		:return: {stage: {"p50": ms, "p90": ms, "p99": ms, "n": samples}} over the rolling window
+		"""
+		result = {}
+		for stage, history in self._history.items():
+			values = np.percentile(np.array(history), PERCENTILES) * 1000.0
+			entry = dict(("p%d" % p, round(float(v), 3)) for p, v in zip(PERCENTILES, values))
+			entry["n"] = len(history)
+			result[stage] = entry
+		return result
+
+
+class _NullTimer(StageTimer):
+	"""
+	Timer that measures nothing, used when no timer is passed in
+	"""
+
+	def begin(self, operation):
+		pass
+
+	def add(self, stage, seconds):
+		pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class TimingLog(object):
+	"""
+	Rotating JSON lines log of stage timings
+
+	Every line is one JSON object with a timestamp, the number of operations
+	timed so far, the rolling percentiles per stage in ms, the stages of the
+	last operation and any extra fields passed to write (machine name, ...).
+	"""
+
+	def __init__(self, path, max_bytes=1024 * 1024, backups=3):
+		# type: (str, int, int) -> None
+		self.path = path
+		folder = os.path.dirname(path)
+		if folder and not os.path.isdir(folder):
+			os.makedirs(folder)
+		self._logger = logging.getLogger("animFilters.timing.%s" % path)
+		self._logger.propagate = False
+		self._logger.setLevel(logging.INFO)
+		if not self._logger.handlers:
+			handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+			handler.setFormatter(logging.Formatter("%(message)s"))
+			self._logger.addHandler(handler)
+
+	def write(self, timer, **fields):
+		# type: (StageTimer, ...) -> None
+		entry = {
+			"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"operations": timer.count,
+			"percentiles": timer.percentiles(),
+		}
+		if timer.last:
+			entry["last"] = dict((stage, round(seconds * 1000.0, 3)) for stage, seconds in timer.last["stages"].items())
+			entry["last_operation"] = timer.last["operation"]
+		entry.update(fields)
+		self._logger.info(json.dumps(entry, sort_keys=True))
+
+	def close(self):
+		for handler in list(self._logger.handlers):
+			handler.close()
+			self._logger.removeHandler(handler)
@@ -0,0 +1,99 @@
+#
+# Copyright 2018 Michal Mach
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+
+class FilterWorker(object):
+	"""
+	Runs filter jobs on a background thread, newest job wins
+
+	Only one job is kept pending, submitting replaces it, so a burst of
+	parameter changes computes at most the job that is already running and
+	the latest one. Every submit or cancel starts a new generation and results
+	of older generations are never delivered.
+
+	The callback is called on the worker thread as callback(generation,
+	result, error). Jobs must only read their arguments (read-only curve
+	buffers, decimation trees) and must not touch the host, writing the
+	result belongs to the UI thread.
+	"""
+
+	def __init__(self, callback):
+		# type: (callable) -> None
+		self.callback = callback
+		self.generation = 0
+		self._job = None
+		self._thread = None
+		self._condition = threading.Condition()
+
+	def submit(self, func, *args):
+		# type: (callable, ...) -> int
+		"""
+		Queue func(*args), dropping a job that has not started yet
+
+		:return: generation of the job
+		"""
+		with self._condition:
+			self.generation += 1
+			self._job = (self.generation, func, args)
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name="animFiltersWorker")
+				self._thread.daemon = True
+				self._thread.start()
+			self._condition.notify()
+			return self.generation
+
+	def cancel(self):
+		"""
+		Drop the pending job and the result of the running one
+		"""
+		with self._condition:
+			self.generation += 1
+			self._job = None
+
+	def is_current(self, generation):
+		# type: (int) -> bool
+		return generation == self.generation
+
+	def stop(self):
+		"""
+		Cancel everything and let the thread exit, a running job is not waited for
+		"""
+		with self._condition:
+			self.generation += 1
+			self._job = None
+			self._thread = None
+			self._condition.notify()
+
+	def _run(self):
+		thread = threading.current_thread()
+		while True:
+			with self._condition:
+				# a stopped thread exits even if submit already started its successor
+				while self._job is None and self._thread is thread:
+					self._condition.wait()
+				if self._thread is not thread:
+					return
+				generation, func, args = self._job
+				self._job = None
+			result = error = None
+			try:
+				result = func(*args)
+			except Exception as e:
+				error = e
+			if self.is_current(generation):
+				self.callback(generation, result, error)
@@ -0,0 +1,149 @@
+"""
+Checks of the animFiltersCore filters against the implementations they replaced
+
+    python -m pytest animFilters/tests
+"""
+import os
+import sys
+import unittest
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from animFiltersCore import batch
+from animFiltersCore.butterworth import butter_lowpass, butter_lowpass_stream
+from animFiltersCore.curves import CurveBuffer
+from animFiltersCore.decimation import DecimationTree, decimate_indices
+from animFiltersCore.median import running_median
+
+
+def resample_keys(kv, thresh):
+	# the recursive adaptive filter of animFilters_2020max.py before animFiltersCore
+	start = float(min(kv.keys()))
+	end = float(max(kv.keys()))
+	startv = float(kv[start])
+	endv = float(kv[end])
+	total_error = 0
+	offender = -1
+	outlier = -1
+	for k, v in kv.items():
+		offset = (k - start) / (end - start)
+		sample = (offset * endv) + ((1 - offset) * startv)
+		delta = abs(v - sample)
+		total_error += delta
+		if delta > outlier:
+			outlier = delta
+			offender = k
+	if total_error < thresh or len(kv.keys()) == 2:
+		return [{start: startv, end: endv}]
+	else:
+		s1 = {kk: vv for kk, vv in kv.items() if kk <= offender}
+		s2 = {kk: vv for kk, vv in kv.items() if kk >= offender}
+		return resample_keys(s1, thresh) + resample_keys(s2, thresh)
+
+
+def reference_kept_times(times, values, tolerance):
+	kept = set()
+	for segment in resample_keys(dict(zip(times.tolist(), values.tolist())), tolerance):
+		kept.update(segment)
+	return sorted(kept)
+
+
+def sample_curves():
+	random = np.random.RandomState(7)
+	frames = np.arange(240, dtype=np.float64)
+	return [
+		np.sin(frames / 9.0) * 40.0 + random.randn(240),
+		np.cumsum(random.randn(240)),
+		np.where(frames < 120, 0.0, 25.0) + random.randn(240) * 0.1,
+		np.round(np.cos(frames / 15.0) * 4.0),
+	]
+
+
+class DecimationTest(unittest.TestCase):
+	tolerances = (0.01, 0.5, 2.0, 10.0, 100.0, 1e6)
+
+	def test_decimate_indices_matches_resample_keys(self):
+		times = np.arange(240, dtype=np.float64)
+		for values in sample_curves():
+			for tolerance in self.tolerances:
+				kept = decimate_indices(times, values, tolerance)
+				self.assertEqual(times[kept].tolist(), reference_kept_times(times, values, tolerance))
+
+	def test_tree_cut_matches_resample_keys(self):
+		times = np.arange(240, dtype=np.float64) + 10.0
+		for values in sample_curves():
+			tree = DecimationTree(CurveBuffer(times, values))
+			for tolerance in self.tolerances:
+				kept = tree.cut_indices(tolerance)
+				self.assertEqual(times[kept].tolist(), reference_kept_times(times, values, tolerance))
+
+	def test_short_curves_keep_every_sample(self):
+		for count in (0, 1, 2):
+			times = np.arange(count, dtype=np.float64)
+			self.assertEqual(decimate_indices(times, times, 1.0).tolist(), list(range(count)))
+			self.assertEqual(DecimationTree(CurveBuffer(times, times)).cut_indices(1.0).tolist(), list(range(count)))
+
+
+class RunningMedianTest(unittest.TestCase):
+
+	def test_matches_medfilt(self):
+		from scipy.signal import medfilt
+		random = np.random.RandomState(3)
+		for count in (1, 7, 50, 400):
+			data = random.randn(count)
+			# repeated values exercise ties between the two heaps
+			data[::5] = 0.5
+			for window_size in (1, 3, 5, 35, 151):
+				with warnings.catch_warnings():
+					# medfilt warns about windows longer than the data, the padding is what is tested
+					warnings.simplefilter("ignore", UserWarning)
+					expected = medfilt(data, window_size)
+				np.testing.assert_array_equal(running_median(data, window_size), expected)
+
+	def test_even_window_is_rejected(self):
+		self.assertRaises(ValueError, running_median, np.zeros(10), 4)
+
+
+class ButterworthStreamTest(unittest.TestCase):
+
+	def test_matches_sosfiltfilt(self):
+		from scipy.signal import sosfiltfilt
+		data = np.cumsum(np.random.RandomState(5).randn(5000))
+		sos = butter_lowpass(5.0, 30.0, order=5)
+		expected = sosfiltfilt(sos, data)
+		for block_size in (1, 7, 1000, 1 << 16):
+			np.testing.assert_allclose(butter_lowpass_stream(data, 5.0, 30.0, 5, block_size), expected, rtol=0, atol=1e-9)
+
+	def test_in_place(self):
+		from scipy.signal import sosfiltfilt
+		data = np.cumsum(np.random.RandomState(6).randn(3000))
+		expected = sosfiltfilt(butter_lowpass(3.0, 30.0, order=4), data)
+		result = butter_lowpass_stream(data, 3.0, 30.0, 4, 256, out=data)
+		self.assertIs(result, data)
+		np.testing.assert_allclose(data, expected, rtol=0, atol=1e-9)
+
+	def test_short_input_falls_back(self):
+		from scipy.signal import sosfiltfilt
+		data = np.random.RandomState(8).randn(20)
+		expected = sosfiltfilt(butter_lowpass(5.0, 30.0, order=5), data)
+		np.testing.assert_allclose(butter_lowpass_stream(data, 5.0, 30.0, 5), expected, rtol=0, atol=1e-9)
+
+	def test_streamed_batch_matches_stacked(self):
+		curves = {"curve": CurveBuffer.from_samples(0, np.cumsum(np.random.RandomState(9).randn(5000)))}
+		stream_min_frames = batch.STREAM_MIN_FRAMES
+		try:
+			for fs in (30.0, 24.0, 60.0):
+				batch.STREAM_MIN_FRAMES = 1 << 40
+				expected = batch.butterworth_batch(curves, 3.0, fs, 5)["curve"].values
+				batch.STREAM_MIN_FRAMES = 1000
+				streamed = batch.butterworth_batch(curves, 3.0, fs, 5)["curve"].values
+				np.testing.assert_allclose(streamed, expected, rtol=0, atol=1e-9)
+		finally:
+			batch.STREAM_MIN_FRAMES = stream_min_frames
+
+
+if __name__ == "__main__":
+	unittest.main()
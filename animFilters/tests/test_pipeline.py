@@ -0,0 +1,72 @@
+"""
+Checks of the preview pipeline on the in-memory host
+
+    python -m pytest animFilters/tests
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from animFiltersCore.curves import CurveBuffer
+from animFiltersCore.filters import adaptive_filter, build_decimation_trees, butterworth_filter, display_curves, median_filter
+from animFiltersCore.hosts import FakeHost
+from animFiltersCore.pipeline import PreviewWriter, apply_curves, get_raw_curves
+
+
+def make_tracks():
+	random = np.random.RandomState(11)
+	tracks = {}
+	for i in range(4):
+		frames = np.arange(0, 300, 3 + i, dtype=np.float64) + i
+		values = np.cumsum(random.randn(frames.shape[0])) * (i + 1)
+		tracks["track%d" % i] = CurveBuffer(frames, values)
+	return tracks
+
+
+class PreviewWriterTest(unittest.TestCase):
+
+	def test_matches_full_writes(self):
+		# every tab and slider the UI offers, in an order that keeps switching filters
+		trees = {}
+		steps = [
+			lambda raw: adaptive_filter(raw, 5.0, trees),
+			lambda raw: median_filter(raw, 9),
+			lambda raw: butterworth_filter(raw, 30.0, 4.0, 5),
+			lambda raw: adaptive_filter(raw, 50.0, trees),
+			lambda raw: display_curves(adaptive_filter(raw, 0.5, trees), 40),
+			lambda raw: median_filter(raw, 35),
+			lambda raw: display_curves(butterworth_filter(raw, 30.0, 2.0, 3), 25),
+			lambda raw: adaptive_filter(raw, 5.0, trees),
+			lambda raw: butterworth_filter(raw, 30.0, 8.0, 4),
+			lambda raw: None,
+		]
+		edited = FakeHost(make_tracks())
+		full = FakeHost(make_tracks())
+		raw = get_raw_curves(edited)
+		trees.update(build_decimation_trees(raw))
+		writer = PreviewWriter(edited)
+		for step in steps:
+			processed = step(raw)
+			apply_curves(edited, raw, processed, writer=writer)
+			apply_curves(full, raw, processed)
+			for track in raw:
+				np.testing.assert_array_equal(edited.tracks[track].times, full.tracks[track].times)
+				np.testing.assert_array_equal(edited.tracks[track].values, full.tracks[track].values)
+
+	def test_unchanged_result_sends_nothing(self):
+		host = FakeHost(make_tracks())
+		raw = get_raw_curves(host)
+		writer = PreviewWriter(host)
+		processed = median_filter(raw, 9)
+		apply_curves(host, raw, processed, writer=writer)
+		calls = host.calls
+		apply_curves(host, raw, processed, writer=writer)
+		self.assertEqual(host.calls, calls)
+
+
+if __name__ == "__main__":
+	unittest.main()
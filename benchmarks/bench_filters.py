@@ -0,0 +1,158 @@
+"""
+Filter engine benchmark suite
+
+Times every filter function in each of its parameter regimes on
+deterministic synthetic mocap curves (noise, spikes, plateaus) from 1k to 1M
+frames and writes the results as JSON, so runs of two commits can be
+compared on the same machine.
+
+    python benchmarks/bench_filters.py [--sizes 1000,10000,100000,1000000] [--repeat 3] [--output run.json]
+    python benchmarks/bench_filters.py --output new.json --compare old.json
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "animFilters"))
+
+from animFiltersCore.butterworth import butter_lowpass_stream  # noqa: E402
+from animFiltersCore.curves import CurveBuffer  # noqa: E402
+from animFiltersCore.filters import adaptive_filter, build_decimation_trees, butterworth_filter, median_filter  # noqa: E402
+
+KINDS = ("noise", "spikes", "plateaus")
+SIZES = (1000, 10000, 100000, 1000000)
+
+
+def synthetic_curve(kind, frames, seed=0):
+	# type: (str, int, int) -> CurveBuffer
+	"""
+	Mocap like channel: a smooth random walk plus a kind specific defect
+
+	noise     sensor jitter on every frame
+	spikes    jitter plus about one marker pop every 200 frames
+	plateaus  jitter on top of held poses (occluded marker, holds)
+	"""
+	rng = np.random.RandomState(seed)
+	motion = np.cumsum(np.cumsum(rng.randn(frames)) * 0.01)
+	values = motion + rng.randn(frames) * 0.05
+	if kind == "spikes":
+		pops = rng.randint(0, frames, max(1, frames // 200))
+		values[pops] += rng.randn(pops.shape[0]) * 10.0
+	elif kind == "plateaus":
+		starts = np.sort(rng.randint(0, frames, max(1, frames // 500)))
+		for start in starts:
+			end = min(frames, start + rng.randint(20, 200))
+			values[start:end] = values[start] + rng.randn(end - start) * 0.005
+	elif kind != "noise":
+		raise ValueError("Unknown curve kind %s" % kind)
+	return CurveBuffer.from_samples(0, values).readonly()
+
+
+def regimes():
+	"""
+	(filter, regime, setup, run) per measured case, setup runs once outside the timing
+	"""
+	return (
+		("adaptive", "tolerance 0.05", None, lambda raw, state: adaptive_filter(raw, 0.05)),
+		("adaptive", "tolerance 0.5", None, lambda raw, state: adaptive_filter(raw, 0.5)),
+		("adaptive", "tree build", None, lambda raw, state: build_decimation_trees(raw)),
+		("adaptive", "tree cut 0.25", build_decimation_trees, lambda raw, trees: adaptive_filter(raw, 0.25, trees)),
+		("butterworth", "scene rate order 5", None, lambda raw, state: butterworth_filter(raw, 30.0, 7.0, 5)),
+		("butterworth", "resampled 60Hz order 5", None, lambda raw, state: butterworth_filter(raw, 60.0, 7.0, 5)),
+		("butterworth", "scene rate order 10", None, lambda raw, state: butterworth_filter(raw, 30.0, 3.0, 10)),
+		("butterworth", "streamed order 5", None, lambda raw, state: butter_lowpass_stream(raw["curve"].values, 7.0, 30.0, 5)),
+		("median", "window 5", None, lambda raw, state: median_filter(raw, 5)),
+		("median", "window 35", None, lambda raw, state: median_filter(raw, 35)),
+		("median", "window 301", None, lambda raw, state: median_filter(raw, 301)),
+	)
+
+
+def git_commit():
+	try:
+		root = os.path.dirname(os.path.abspath(__file__))
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root).decode("ascii").strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def run(sizes, kinds, repeat, only=None):
+	results = []
+	for frames in sizes:
+		# keep the 1M frame cases to a couple of runs
+		count = max(1, min(repeat, 3000000 // frames))
+		for kind in kinds:
+			raw = {"curve": synthetic_curve(kind, frames)}
+			for name, regime, setup, func in regimes():
+				if only and name not in only:
+					continue
+				state = setup(raw) if setup is not None else None
+				times = timeit.repeat(lambda: func(raw, state), number=1, repeat=count)
+				best = min(times)
+				results.append({
+					"filter": name,
+					"regime": regime,
+					"kind": kind,
+					"frames": frames,
+					"repeat": count,
+					"best_s": best,
+					"median_s": float(np.median(times)),
+					"frames_per_s": frames / max(best, 1e-12),
+				})
+				print("%-12s %-24s %-9s %8d  %10.3fms" % (name, regime, kind, frames, best * 1000.0))
+	return results
+
+
+def compare(results, baseline):
+	old = dict(((r["filter"], r["regime"], r["kind"], r["frames"]), r["best_s"]) for r in baseline["results"])
+	print("\ncompared with %s (%s):" % (baseline.get("commit"), baseline.get("date")))
+	for r in results:
+		key = (r["filter"], r["regime"], r["kind"], r["frames"])
+		if key in old:
+			ratio = r["best_s"] / max(old[key], 1e-12)
+			flag = "  slower" if ratio > 1.1 else ("  faster" if ratio < 0.9 else "")
+			print("%-12s %-24s %-9s %8d  %6.2fx%s" % (key + (ratio, flag)))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES), help="comma separated frame counts")
+	parser.add_argument("--kinds", default=",".join(KINDS))
+	parser.add_argument("--filters", default="", help="comma separated subset of adaptive, butterworth, median")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--output", help="write the results to this JSON file")
+	parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+	args = parser.parse_args()
+
+	sizes = [int(s) for s in args.sizes.split(",") if s]
+	kinds = [k for k in args.kinds.split(",") if k]
+	only = [f for f in args.filters.split(",") if f]
+	report = {
+		"commit": git_commit(),
+		"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"numpy": np.__version__,
+		"scipy": scipy.__version__,
+		"machine": platform.platform(),
+		"processor": platform.processor() or platform.machine(),
+		"results": run(sizes, kinds, args.repeat, only),
+	}
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=1, sort_keys=True)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(report["results"], json.load(f))
+
+
+if __name__ == "__main__":
+	main()
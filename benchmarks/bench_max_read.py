@@ -0,0 +1,55 @@
+"""
+3ds Max track read benchmark
+
+Run inside 3ds Max with tracks selected in the first Track View:
+
+    python.ExecuteFile @"<repo>\\benchmarks\\bench_max_read.py"
+
+Compares the per frame / per key pymxs loops with the bulk MAXScript helpers
+of MaxHost and checks that both return the same curves.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "animFilters"))
+
+from animFiltersCore.hosts import MaxHost  # noqa: E402
+
+
+def timed(function, *args):
+	start = time.time()
+	result = function(*args)
+	return result, time.time() - start
+
+
+def main():
+	loop_host = MaxHost(bulk=False)
+	bulk_host = MaxHost(bulk=True)
+	tracks = bulk_host.selected_tracks() or []
+	if not tracks:
+		print("Select some tracks in the first Track View.")
+		return
+	totals = [0.0, 0.0, 0.0, 0.0]
+	frames = 0
+	for track in tracks:
+		loop_samples, loop_sample_time = timed(loop_host.sample_values, track)
+		bulk_samples, bulk_sample_time = timed(bulk_host.sample_values, track)
+		loop_keys, loop_key_time = timed(loop_host.read_keys, track)
+		bulk_keys, bulk_key_time = timed(bulk_host.read_keys, track)
+		assert np.allclose(loop_samples.values, bulk_samples.values)
+		assert np.allclose(loop_keys.values, bulk_keys.values)
+		frames += len(loop_samples)
+		for i, spent in enumerate((loop_sample_time, bulk_sample_time, loop_key_time, bulk_key_time)):
+			totals[i] += spent
+	print("tracks: %d  frames: %d" % (len(tracks), frames))
+	print("sample  per frame %8.1fms  bulk %8.1fms" % (totals[0] * 1000.0, totals[1] * 1000.0))
+	print("keys    per key   %8.1fms  bulk %8.1fms" % (totals[2] * 1000.0, totals[3] * 1000.0))
+
+
+if __name__ == "__main__":
+	main()
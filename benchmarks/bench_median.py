@@ -0,0 +1,69 @@
+"""
+Median engine benchmark
+
+Times scipy.signal.medfilt, the running median from animFiltersCore and the
+engine median_filter_1d picks across window sizes, and checks that all of
+them return the same samples. RUNNING_MEDIAN_MIN_WINDOW comes from the
+medfilt column with SciPy < 1.12 installed, like the builds shipped for 3ds
+Max. --strided adds a plain NumPy median over strided windows for reference.
+
+    python benchmarks/bench_median.py [--frames 20000] [--repeat 3] [--strided]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy.signal import medfilt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "animFilters"))
+
+from animFiltersCore.median import median_filter_1d, running_median  # noqa: E402
+
+WINDOWS = (15, 35, 65, 101, 151, 201, 301, 501, 1001, 3001)
+
+
+def strided_median(x, window_size):
+	half = window_size // 2
+	padded = np.concatenate((np.zeros(half), x, np.zeros(half)))
+	windows = as_strided(padded, shape=(x.shape[0], window_size), strides=(padded.strides[0],) * 2)
+	return np.median(windows, axis=1)
+
+
+ENGINES = (
+	("medfilt", lambda x, w: medfilt(x, w)),
+	("running", running_median),
+	("auto", median_filter_1d),
+)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--frames", type=int, default=20000)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--strided", action="store_true", help="also time a NumPy median over strided windows")
+	args = parser.parse_args()
+	engines = ENGINES + ((("strided", strided_median),) if args.strided else ())
+
+	rng = np.random.RandomState(0)
+	x = np.cumsum(rng.randn(args.frames)) + rng.randn(args.frames) * 0.5
+
+	print("frames: %d" % args.frames)
+	print("window " + "".join("%12s" % name for name, _ in engines) + "   match")
+	for window_size in WINDOWS:
+		reference = medfilt(x, window_size)
+		row = []
+		match = True
+		for name, engine in engines:
+			match = match and np.array_equal(engine(x, window_size), reference)
+			best = min(timeit.repeat(lambda: engine(x, window_size), number=1, repeat=args.repeat))
+			row.append("%10.2fms" % (best * 1000.0))
+		print("%6d " % window_size + " ".join(row) + "   %s" % ("yes" if match else "NO"))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+"""
+Preview / apply pipeline benchmark against the in-memory host
+
+Runs Preview (snapshot, sample, filter, write), one slider refresh and Cancel
+for every filter tab on a FakeHost that charges a fixed latency per host
+round trip, so the effect of host crossings can be measured without 3ds Max.
+Refreshes go through a PreviewWriter like the UI does.
+
+    python benchmarks/bench_pipeline.py [--tracks 20] [--frames 2000] [--latency 20e-6] [--per-key] [--profile]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "animFilters"))
+
+from animFiltersCore.curves import CurveBuffer  # noqa: E402
+from animFiltersCore.filters import adaptive_filter, build_decimation_trees, butterworth_filter, median_filter  # noqa: E402
+from animFiltersCore.hosts import FakeHost  # noqa: E402
+from animFiltersCore.pipeline import PreviewWriter, apply_curves, copy_original_curves, get_raw_curves, paste_clipboard_curves  # noqa: E402
+from animFiltersCore.profiler import HostProfiler  # noqa: E402
+
+
+def make_host(tracks, frames, latency, bulk):
+	rng = np.random.RandomState(0)
+	curves = {}
+	for i in range(tracks):
+		values = np.cumsum(rng.randn(frames)) * 0.1 + rng.randn(frames) * 0.05
+		curves["track_%03d" % i] = CurveBuffer.from_samples(0, values)
+	return FakeHost(curves, latency=latency, bulk=bulk)
+
+
+def run_tab(host, name, refresh, profiler=None):
+	profiler = profiler or HostProfiler()
+	start = time.time()
+	calls = host.calls
+	writer = PreviewWriter(host)
+	profiler.begin("preview")
+	originals, first, last = copy_original_curves(host)
+	raw = get_raw_curves(host)
+	state = refresh(raw, None, 0, writer)
+	preview = time.time()
+	refresh_calls = host.calls
+	profiler.begin("refresh")
+	refresh(raw, state, 1, writer)
+	update = time.time()
+	refresh_calls = host.calls - refresh_calls
+	profiler.begin("cancel")
+	paste_clipboard_curves(host, originals, first, last)
+	writer.reset()
+	profiler.end()
+	end = time.time()
+	print("%-11s preview %8.1fms  refresh %8.1fms  cancel %8.1fms  host calls %d (refresh %d)" % (
+		name, (preview - start) * 1000.0, (update - preview) * 1000.0, (end - update) * 1000.0,
+		host.calls - calls, refresh_calls))
+
+
+# the second refresh is a one notch slider move
+def adaptive(host):
+	def refresh(raw, trees, step, writer):
+		trees = trees or build_decimation_trees(raw)
+		apply_curves(host, raw, adaptive_filter(raw, 0.25 + 0.01 * step, trees), writer)
+		return trees
+	return refresh
+
+
+def butterworth(host):
+	def refresh(raw, state, step, writer):
+		apply_curves(host, raw, butterworth_filter(raw, 30.0, 7.0 - 0.1 * step, 5), writer)
+	return refresh
+
+
+def median(host):
+	def refresh(raw, state, step, writer):
+		apply_curves(host, raw, median_filter(raw, 35 + 2 * step), writer)
+	return refresh
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--tracks", type=int, default=20)
+	parser.add_argument("--frames", type=int, default=2000)
+	parser.add_argument("--latency", type=float, default=20e-6, help="seconds per host round trip")
+	parser.add_argument("--per-key", action="store_true", help="emulate one round trip per frame/key")
+	parser.add_argument("--profile", action="store_true", help="report host calls per operation and call site")
+	args = parser.parse_args()
+
+	host = make_host(args.tracks, args.frames, args.latency, not args.per_key)
+	print("tracks: %d  frames: %d  latency: %gs  %s" % (
+		args.tracks, args.frames, args.latency, "per key" if args.per_key else "bulk"))
+	for name, tab in (("adaptive", adaptive), ("butterworth", butterworth), ("median", median)):
+		profiler = HostProfiler()
+		if args.profile:
+			profiler.attach(host)
+		run_tab(host, name, tab(host), profiler)
+		if args.profile:
+			profiler.detach(host)
+			print(profiler.report(top=5))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,89 @@
+"""
+Tool startup benchmark
+
+Measures in fresh interpreters what opening the window costs before any
+filter runs: importing the core modules the UI imports, loading the .ui file
+(when PySide2 is installed, offscreen) and, separately, the first filter
+call that pulls in scipy. Exits with status 1 when the median cold open is
+over the target, so it can gate changes that add imports.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--target-ms 300]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "animFilters")
+
+# runs in a fresh interpreter, prints one JSON object of milliseconds
+PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, %(root)r)
+result = {}
+start = time.time()
+from animFiltersCore.cache import ResultCache
+from animFiltersCore.filters import adaptive_filter, build_decimation_trees, butterworth_filter, display_curves, median_filter
+from animFiltersCore.hosts import MaxHost
+from animFiltersCore.pipeline import PreviewWriter, apply_curves, copy_original_curves, get_raw_curves, paste_clipboard_curves
+from animFiltersCore.profiler import HostProfiler
+from animFiltersCore.timing import StageTimer, TimingLog, timed
+from animFiltersCore.worker import FilterWorker
+result["import"] = (time.time() - start) * 1000.0
+result["scipy_loaded"] = sorted(m for m in ("scipy.signal", "scipy.ndimage") if m in sys.modules)
+try:
+	os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+	from PySide2 import QtCore, QtUiTools, QtWidgets
+except ImportError:
+	pass
+else:
+	app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+	start = time.time()
+	uifile = QtCore.QFile(os.path.join(%(root)r, "animFilters.ui"))
+	uifile.open(QtCore.QFile.ReadOnly)
+	QtUiTools.QUiLoader().load(uifile)
+	uifile.close()
+	result["ui"] = (time.time() - start) * 1000.0
+import numpy as np
+from animFiltersCore.curves import CurveBuffer
+curves = {"curve": CurveBuffer.from_samples(0, np.random.RandomState(0).randn(1000))}
+start = time.time()
+butterworth_filter(curves, 30.0, 7.0, 5)
+median_filter(curves, 35)
+result["first_filter"] = (time.time() - start) * 1000.0
+print(json.dumps(result))
+"""
+
+
+def probe():
+	output = subprocess.check_output([sys.executable, "-c", PROBE % {"root": os.path.abspath(ROOT)}])
+	return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--target-ms", type=float, default=300.0, help="budget for imports plus the .ui load")
+	args = parser.parse_args()
+
+	# the first run warms the OS file cache, like a second launch of 3ds Max would
+	probe()
+	runs = [probe() for _ in range(max(1, args.repeat))]
+	for stage in ("import", "ui", "first_filter"):
+		times = [run[stage] for run in runs if stage in run]
+		if times:
+			print("%-13s median %8.1fms  best %8.1fms" % (stage, np.median(times), min(times)))
+	if runs[0]["scipy_loaded"]:
+		print("eagerly imported: %s" % ", ".join(runs[0]["scipy_loaded"]))
+	cold_open = float(np.median([run["import"] + run.get("ui", 0.0) for run in runs]))
+	print("cold open %.1fms, target %.0fms" % (cold_open, args.target_ms))
+	return 0 if cold_open <= args.target_ms else 1
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Compile animFilters.ui to a Python module in every tool folder
+
+The tool imports animFilters_ui.py instead of parsing the .ui file with
+QUiLoader when the compiled module is there and not older than the .ui.
+Run after editing the .ui, needs PySide2's pyside2-uic on the PATH:
+
+    python build_ui.py [--uic pyside2-uic]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOOL_FOLDERS = ("animFilters", os.path.join("2020", "animFilters"), os.path.join("2021", "animFilters"))
+UI_FILE = "animFilters.ui"
+UI_MODULE = "animFilters_ui.py"
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--uic", default="pyside2-uic", help="uic command producing PySide2 code")
+	args = parser.parse_args()
+
+	for folder in TOOL_FOLDERS:
+		source = os.path.join(ROOT, folder, UI_FILE)
+		if not os.path.isfile(source):
+			continue
+		target = os.path.join(ROOT, folder, UI_MODULE)
+		try:
+			subprocess.check_call([args.uic, source, "-o", target])
+		except OSError:
+			print("%s not found, install PySide2 or pass --uic" % args.uic, file=sys.stderr)
+			return 1
+		print(target)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())